@@ -25,157 +25,118 @@ Multi-objective cost function:
     α + β + γ = 1
 """
 
-import heapq
 import math
 import time as time_module
-from typing import Dict, List, Optional, Tuple, Any
-from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Any, Union
+from datetime import datetime
 
+import numpy as np
 import networkx as nx
 
 from utils.haversine import haversine
-from algorithms.emissions import emission_factor
+from algorithms.emissions import emission_factors, EF_LUT
+from algorithms.graph_builder import CSRGraph, get_csr, get_reverse_csr, find_nearest_node
+from algorithms.astar_numba import _astar_core, _bidirectional_astar_core, _find_edges
 from config import graph_config, routing_config
 
+# BPR volume/capacity ratio by hour of day: peaks 7-9 and 17-19, midday 9-17,
+# shoulders 5-7 and 19-22, night otherwise. float64 so the Python and kernel
+# weights agree exactly.
+VOLUME_RATIO_BY_HOUR = np.array(
+    [0.15] * 5      # 00-05 night
+    + [0.4] * 2     # 05-07 shoulder
+    + [0.85] * 2    # 07-09 peak
+    + [0.6] * 8     # 09-17 midday
+    + [0.85] * 2    # 17-19 peak
+    + [0.4] * 3     # 19-22 shoulder
+    + [0.15] * 2,   # 22-24 night
+    dtype=np.float64,
+)
 
-def heuristic(
-    G: nx.DiGraph,
-    node: int,
-    goal: int,
-    v_max_ms: float,
-) -> float:
-    """Haversine heuristic (admissible, consistent).
-
-    h(n, goal) = 2R · arctan2(√a, √(1−a)) / v_max
-
-    Args:
-        G: the road network graph
-        node: current node
-        goal: goal node
-        v_max_ms: maximum speed in m/s
-
-    Returns:
-        Estimated time in seconds to reach goal from node
-    """
-    node_data = G.nodes[node]
-    goal_data = G.nodes[goal]
-    dist_m = haversine(node_data["lat"], node_data["lng"], goal_data["lat"], goal_data["lng"])
-    return dist_m / v_max_ms if v_max_ms > 0 else float("inf")
-
+MAX_ITERATIONS = 100000
 
-def bpr_travel_time(
-    length_m: float,
-    free_flow_speed_kmh: float,
-    volume: float,
-    capacity: float,
-) -> float:
-    """BPR (Bureau of Public Roads) function for travel time.
+# {"u-v": {speed, flow, congestion}} per edge, or float32[E] predicted speeds
+# (km/h) in CSR edge order
+TrafficPredictions = Union[Dict[str, Dict], np.ndarray]
 
-    t(e) = t₀(e) × [1 + 0.15 × (volume(e)/capacity(e))⁴]
-    t₀(e) = length(e) / free_flow_speed(e)
+# Straight-line distance below which bidirectional search is not worth
+# running and astar_route uses the unidirectional search instead
+BIDIRECTIONAL_MIN_DISTANCE_M = 5000.0
 
-    Args:
-        length_m: edge length in meters
-        free_flow_speed_kmh: free flow speed in km/h
-        volume: current traffic volume
-        capacity: edge capacity
+_EPOCH = datetime(1970, 1, 1)
 
-    Returns:
-        Travel time in seconds
-    """
-    free_flow_speed_ms = free_flow_speed_kmh / 3.6
-    if free_flow_speed_ms <= 0:
-        return float("inf")
 
-    t0 = length_m / free_flow_speed_ms  # free flow travel time in seconds
+def _wall_clock_seconds(dt: datetime) -> float:
+    """Seconds since the epoch of dt's wall-clock time (timezone ignored),
+    so that int(t / 3600) % 24 == dt.hour."""
+    return (dt.replace(tzinfo=None) - _EPOCH).total_seconds()
 
-    vc_ratio = volume / capacity if capacity > 0 else 0.0
-    travel_time = t0 * (1.0 + graph_config.bpr_alpha * (vc_ratio ** graph_config.bpr_beta))
-    return travel_time
 
+def bpr_factor_by_hour() -> np.ndarray:
+    """BPR congestion factor for each hour of day.
 
-def time_dependent_weight(
-    edge_data: Dict[str, Any],
-    current_time: datetime,
-    traffic_predictions: Optional[Dict[str, Dict]] = None,
-    edge_key: Optional[str] = None,
-) -> Tuple[float, float]:
-    """Calculate time-dependent edge weight.
+    factor[h] = 1 + α_bpr × VOLUME_RATIO_BY_HOUR[h]^β_bpr
 
-    w(e, t) = length(e) / v_predicted(e, t)
-    When no LSTM prediction available, use BPR function.
+    The volume ratio depends only on the hour, so the 24 factors are built
+    once (BPR_FACTOR_BY_HOUR) and edges with capacity multiply t₀ by
+    factor[hour] (edges without capacity keep t₀, since 1 + α_bpr × 0^β_bpr = 1).
+    """
+    return 1.0 + graph_config.bpr_alpha * VOLUME_RATIO_BY_HOUR ** graph_config.bpr_beta
 
-    Args:
-        edge_data: edge attributes from graph
-        current_time: current simulation time
-        traffic_predictions: dict of {segment_id: {speed, flow, congestion}}
-        edge_key: identifier for this edge segment
 
-    Returns:
-        (travel_time_seconds, predicted_speed_kmh)
-    """
-    length_m = edge_data["length_m"]
-    free_flow_speed = edge_data.get("free_flow_speed_kmh", edge_data.get("speed_limit_kmh", 40.0))
-    capacity = edge_data.get("capacity", 1800)
-
-    predicted_speed = None
-
-    # Check if LSTM prediction is available
-    if traffic_predictions and edge_key and edge_key in traffic_predictions:
-        pred = traffic_predictions[edge_key]
-        predicted_speed = pred.get("speed", None)
-        if predicted_speed and predicted_speed > 0:
-            # w(e,t) = length(e) / v_predicted(e, t)
-            speed_ms = predicted_speed / 3.6
-            travel_time = length_m / speed_ms
-            return travel_time, predicted_speed
-
-    # BPR fallback
-    # Estimate volume based on time of day
-    hour = current_time.hour + current_time.minute / 60.0
-    # Simple volume model based on time of day
-    if 7 <= hour < 9 or 17 <= hour < 19:
-        volume_ratio = 0.85  # Peak hours
-    elif 9 <= hour < 17:
-        volume_ratio = 0.6   # Midday
-    elif 5 <= hour < 7 or 19 <= hour < 22:
-        volume_ratio = 0.4   # Shoulders
-    else:
-        volume_ratio = 0.15  # Night
+# graph_config is frozen, so the factors never change after import
+BPR_FACTOR_BY_HOUR = bpr_factor_by_hour()
+BPR_FACTOR_BY_HOUR.flags.writeable = False
 
-    volume = capacity * volume_ratio
-    travel_time = bpr_travel_time(length_m, free_flow_speed, volume, capacity)
-    effective_speed = (length_m / travel_time * 3.6) if travel_time > 0 else free_flow_speed
 
-    return travel_time, effective_speed
+def edge_index(csr: CSRGraph, u: int, v: int) -> int:
+    """CSR edge id of the graph edge u → v (node ids), or -1 if there is none."""
+    ui = csr.node_index.get(u)
+    vi = csr.node_index.get(v)
+    if ui is None or vi is None:
+        return -1
+    lo, hi = csr.indptr[ui], csr.indptr[ui + 1]
+    matches = np.flatnonzero(csr.indices[lo:hi] == vi)
+    return int(lo + matches[0]) if len(matches) else -1
 
 
-def multi_objective_cost(
-    travel_time_s: float,
-    distance_m: float,
-    speed_kmh: float,
-    alpha: float,
-    beta: float,
-    gamma: float,
-) -> float:
-    """Multi-objective cost function.
+def prediction_speeds(
+    csr: CSRGraph,
+    traffic_predictions: Optional[TrafficPredictions] = None,
+) -> np.ndarray:
+    """Resolve traffic predictions to a per-edge speed array.
 
-    Cost(path) = α·T(path) + β·E(path) + γ·D(path)
-    T = travel time in seconds (normalized)
-    E = emissions in gCO₂ (normalized)
-    D = distance in meters (normalized)
+    Predictions are either {"u-v": {speed, ...}} or an array of predicted
+    speeds in km/h already in CSR edge order (see edge_index), with NaN or 0
+    where there is none. The array form is used as is, without a per-edge
+    key lookup.
 
-    α + β + γ = 1
+    Returns float32[E] in CSR edge order, NaN where no prediction exists.
+    Each dict key is parsed once and matched against the outgoing edges of u.
     """
-    distance_km = distance_m / 1000.0
-    co2_grams = distance_km * emission_factor(speed_kmh)
+    if isinstance(traffic_predictions, np.ndarray):
+        if traffic_predictions.shape != (csr.num_edges,):
+            raise ValueError(
+                f"traffic_predictions array must have shape ({csr.num_edges},), "
+                f"got {traffic_predictions.shape}"
+            )
+        return traffic_predictions.astype(np.float32, copy=False)
 
-    # Normalize to make components comparable
-    t_norm = travel_time_s / 60.0   # minutes
-    e_norm = co2_grams / 100.0       # per 100g
-    d_norm = distance_m / 1000.0     # km
+    pred_speed = np.full(csr.num_edges, np.nan, dtype=np.float32)
+    if not traffic_predictions:
+        return pred_speed
 
-    return alpha * t_norm + beta * e_norm + gamma * d_norm
+    for edge_key, pred in traffic_predictions.items():
+        if not pred or not pred.get("speed"):
+            continue
+        u_str, _, v_str = edge_key.partition("-")
+        try:
+            k = edge_index(csr, int(u_str), int(v_str))
+        except ValueError:
+            continue
+        if k >= 0:
+            pred_speed[k] = pred["speed"]
+    return pred_speed
 
 
 def astar_route(
@@ -186,7 +147,9 @@ def astar_route(
     alpha: float = 0.5,
     beta: float = 0.35,
     gamma: float = 0.15,
-    traffic_predictions: Optional[Dict[str, Dict]] = None,
+    traffic_predictions: Optional[TrafficPredictions] = None,
+    use_bidirectional: bool = False,
+    epsilon: float = 1.0,
 ) -> Optional[Dict[str, Any]]:
     """Time-Dependent A* with multi-objective cost.
 
@@ -201,131 +164,68 @@ def astar_route(
             if g_new < g(m, *):
                 update g(m, t_arrival) = g_new
 
+    With use_bidirectional, routes whose endpoints are at least
+    BIDIRECTIONAL_MIN_DISTANCE_M apart are searched from both ends at once
+    (backward weights taken at the departure hour, final path re-timed
+    forward); shorter routes always use the unidirectional search.
+
+    epsilon > 1 runs weighted A*, f(n) = g(n) + ε·h(n): fewer expansions,
+    at a path cost of at most ε × optimal. The default ε = 1 is exact A*.
+
     Returns:
         Dict with path, polyline, distance, duration, co2, cost or None if no path.
     """
     if start not in G or goal not in G:
         return None
 
-    # Maximum speed in graph (for admissible heuristic)
-    v_max_kmh = graph_config.v_max_kmh
-    v_max_ms = v_max_kmh / 3.6
-
-    # Priority queue: (f_cost, counter, node, arrival_time, g_cost)
-    counter = 0
-    open_set: List[Tuple[float, int, int, datetime, float]] = []
-    h_start = heuristic(G, start, goal, v_max_ms)
-    heapq.heappush(open_set, (h_start, counter, start, departure_time, 0.0))
-
-    # g_scores: node -> best g cost found
-    g_scores: Dict[int, float] = {start: 0.0}
-    # came_from: node -> (parent_node, edge_data)
-    came_from: Dict[int, Tuple[int, Dict]] = {}
-    # arrival_times: node -> arrival time
-    arrival_times: Dict[int, datetime] = {start: departure_time}
-
-    # Track per-edge data for result construction
-    edge_costs: Dict[int, Dict[str, float]] = {}
-
-    visited = set()
-    max_iterations = 100000
-
-    while open_set and max_iterations > 0:
-        max_iterations -= 1
-        f_cost, _, current, current_time, current_g = heapq.heappop(open_set)
-
-        if current == goal:
-            # Reconstruct path
-            path = []
-            node = goal
-            while node in came_from:
-                path.append(node)
-                node = came_from[node][0]
-            path.append(start)
-            path.reverse()
-
-            # Build result
-            polyline = []
-            total_distance_m = 0.0
-            total_duration_s = 0.0
-            total_co2_g = 0.0
-
-            for i in range(len(path)):
-                node_data = G.nodes[path[i]]
-                polyline.append([node_data["lat"], node_data["lng"]])
-
-            for i in range(len(path) - 1):
-                edge_data = G.edges[path[i], path[i + 1]]
-                edge_info = edge_costs.get(path[i + 1], {})
-                seg_dist = edge_data["length_m"]
-                seg_time = edge_info.get("travel_time", seg_dist / (40 / 3.6))
-                seg_speed = edge_info.get("speed", 40.0)
-
-                total_distance_m += seg_dist
-                total_duration_s += seg_time
-                total_co2_g += (seg_dist / 1000.0) * emission_factor(seg_speed)
-
-            return {
-                "path_nodes": path,
-                "polyline": polyline,
-                "distanceKm": total_distance_m / 1000.0,
-                "durationMin": total_duration_s / 60.0,
-                "co2Grams": total_co2_g,
-                "cost": current_g,
-                "nodesExplored": 100000 - max_iterations,
-            }
-
-        if current in visited:
-            continue
-        visited.add(current)
-
-        # Expand neighbors
-        for neighbor in G.successors(current):
-            if neighbor in visited:
-                continue
-
-            edge_data = G.edges[current, neighbor]
-
-            # Time-dependent weight: w(e, t)
-            edge_key = f"{current}-{neighbor}"
-            travel_time, pred_speed = time_dependent_weight(
-                edge_data, current_time, traffic_predictions, edge_key
-            )
-
-            # Multi-objective edge cost
-            edge_cost = multi_objective_cost(
-                travel_time,
-                edge_data["length_m"],
-                pred_speed,
-                alpha, beta, gamma,
-            )
-
-            g_new = current_g + edge_cost
-
-            if g_new < g_scores.get(neighbor, float("inf")):
-                g_scores[neighbor] = g_new
-                t_arrival = current_time + timedelta(seconds=travel_time)
-                arrival_times[neighbor] = t_arrival
-                came_from[neighbor] = (current, edge_data)
-                edge_costs[neighbor] = {
-                    "travel_time": travel_time,
-                    "speed": pred_speed,
-                    "distance": edge_data["length_m"],
-                }
+    csr = get_csr(G)
+    start_idx = csr.node_index[start]
+    goal_idx = csr.node_index[goal]
+
+    pred_speed = prediction_speeds(csr, traffic_predictions)
+
+    search_args = (
+        csr.length_m, csr.length_km, csr.free_flow_ms, csr.t0_s,
+        csr.capacity, pred_speed, csr.lat, csr.lng,
+        start_idx, goal_idx, _wall_clock_seconds(departure_time),
+        alpha, beta, gamma,
+        BPR_FACTOR_BY_HOUR, graph_config.v_max_ms, float(epsilon), EF_LUT,
+        MAX_ITERATIONS,
+    )
+    if use_bidirectional and haversine(
+        csr.lat[start_idx], csr.lng[start_idx], csr.lat[goal_idx], csr.lng[goal_idx]
+    ) >= BIDIRECTIONAL_MIN_DISTANCE_M:
+        rev_indptr, rev_sources, rev_edges = get_reverse_csr(G)
+        result = _bidirectional_astar_core(
+            csr.indptr, csr.indices, rev_indptr, rev_sources, rev_edges, *search_args
+        )
+    else:
+        result = _astar_core(csr.indptr, csr.indices, *search_args)
+    path, path_edges, seg_times, seg_speeds, cost, nodes_explored = result
 
-                h = heuristic(G, neighbor, goal, v_max_ms)
-                f_new = g_new + h
+    if len(path) == 0:
+        return None  # No path found
 
-                counter += 1
-                heapq.heappush(open_set, (f_new, counter, neighbor, t_arrival, g_new))
+    # Build result
+    polyline = np.stack((csr.lat[path], csr.lng[path]), axis=1).tolist()
+    seg_dist_km = csr.length_m[path_edges].astype(np.float64) / 1000.0
+    total_co2_g = float(np.dot(seg_dist_km, emission_factors(seg_speeds)))
 
-    return None  # No path found
+    return {
+        "path_nodes": csr.node_ids[path].tolist(),
+        "polyline": polyline,
+        "distanceKm": float(seg_dist_km.sum()),
+        "durationMin": float(seg_times.sum()) / 60.0,
+        "co2Grams": total_co2_g,
+        "cost": float(cost),
+        "nodesExplored": int(nodes_explored),
+    }
 
 
 def get_traffic_overlay(
     G: nx.DiGraph,
     path_nodes: List[int],
-    traffic_predictions: Optional[Dict[str, Dict]] = None,
+    traffic_predictions: Optional[TrafficPredictions] = None,
     current_time: Optional[datetime] = None,
 ) -> List[Dict[str, Any]]:
     """Generate traffic congestion overlay data for map visualization.
@@ -334,39 +234,74 @@ def get_traffic_overlay(
     """
     if current_time is None:
         current_time = datetime.now()
+    if not path_nodes:
+        return []
+
+    csr = get_csr(G)
+    node_index = csr.node_index
+    idx = np.fromiter((node_index.get(n, -1) for n in path_nodes), np.int32, len(path_nodes))
+
+    # Path edges present in the graph (pairs without an edge are skipped)
+    edge_ids = _find_edges(csr.indptr, csr.indices, idx[:-1], idx[1:])
+    has_edge = edge_ids >= 0
+    ks = edge_ids[has_edge]
+    tails = idx[:-1][has_edge]
+
+    # Same weights as astar_numba._edge_weight: prediction override, else BPR
+    bpr_factor = BPR_FACTOR_BY_HOUR[current_time.hour]
+    travel_time = csr.t0_s[ks] * np.where(csr.capacity[ks] > 0, bpr_factor, 1.0)
+    free_flow = csr.free_flow_ms[ks].astype(np.float64) * 3.6
+    with np.errstate(divide="ignore", invalid="ignore"):
+        speed = np.where(travel_time > 0, csr.length_m[ks] / travel_time * 3.6, free_flow)
+        speed = np.where(free_flow > 0, speed, 0.0)
+        pred = prediction_speeds(csr, traffic_predictions)[ks]
+        speed = np.where(pred > 0, pred, speed)
+        congestion = np.where(free_flow > 0, np.clip(1.0 - speed / free_flow, 0.0, 1.0), 0.0)
+
+    overlay = [
+        {"lat": lat, "lng": lng, "congestion": round(c, 3), "speed": round(v, 1)}
+        for lat, lng, c, v in zip(
+            csr.lat[tails].tolist(), csr.lng[tails].tolist(),
+            congestion.tolist(), speed.tolist(),
+        )
+    ]
 
-    overlay = []
-    for i in range(len(path_nodes) - 1):
-        n1 = path_nodes[i]
-        n2 = path_nodes[i + 1]
-
-        if not G.has_edge(n1, n2):
-            continue
-
-        edge_data = G.edges[n1, n2]
-        edge_key = f"{n1}-{n2}"
-
-        _, speed = time_dependent_weight(edge_data, current_time, traffic_predictions, edge_key)
+    # Add last node
+    last = node_index[path_nodes[-1]]
+    overlay.append({
+        "lat": float(csr.lat[last]),
+        "lng": float(csr.lng[last]),
+        "congestion": overlay[-1]["congestion"] if overlay else 0.0,
+        "speed": overlay[-1]["speed"] if overlay else 40.0,
+    })
 
-        free_flow = edge_data.get("free_flow_speed_kmh", 40.0)
-        congestion = max(0.0, min(1.0, 1.0 - speed / free_flow)) if free_flow > 0 else 0.0
+    return overlay
 
-        node_data = G.nodes[n1]
-        overlay.append({
-            "lat": node_data["lat"],
-            "lng": node_data["lng"],
-            "congestion": round(congestion, 3),
-            "speed": round(speed, 1),
-        })
 
-    # Add last node
-    if path_nodes:
-        last_node = G.nodes[path_nodes[-1]]
-        overlay.append({
-            "lat": last_node["lat"],
-            "lng": last_node["lng"],
-            "congestion": overlay[-1]["congestion"] if overlay else 0.0,
-            "speed": overlay[-1]["speed"] if overlay else 40.0,
-        })
+def warmup() -> None:
+    """Compile, or load from Numba's on-disk cache, every routing kernel.
 
-    return overlay
+    Runs one tiny query through each code path. Called at image build time so
+    the compiled kernels ship in the image's cache, and at service startup so
+    the first route request does not pay the JIT latency.
+    """
+    G = nx.DiGraph()
+    G.add_node(1, lat=0.0, lng=0.0)
+    G.add_node(2, lat=0.0, lng=0.1)
+    G.add_edge(
+        1, 2,
+        length_m=haversine(0.0, 0.0, 0.0, 0.1),
+        speed_limit_kmh=40.0,
+        free_flow_speed_kmh=40.0,
+        lanes=1,
+        road_type="primary",
+        oneway=True,
+        capacity=1800,
+        osm_way_id=0,
+    )
+
+    find_nearest_node(G, 0.0, 0.0)
+    departure = datetime(2024, 1, 1, 8, 0)
+    for use_bidirectional in (False, True):
+        result = astar_route(G, 1, 2, departure, use_bidirectional=use_bidirectional)
+    get_traffic_overlay(G, result["path_nodes"], None, departure)
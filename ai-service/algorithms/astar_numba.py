@@ -0,0 +1,469 @@
+"""
+Numba-compiled core of the time-dependent A* search.
+
+Operates purely on the CSR arrays built by graph_builder.build_csr, so the
+whole expansion loop (heap operations, BPR/prediction weights, emission
+lookup, haversine heuristic) runs as native code. Time is carried as float
+seconds: dep_t_sec is the departure wall-clock time in seconds since the
+epoch and each heap entry stores the seconds elapsed since departure.
+
+Edge weight, cost and heuristic (formulas of algorithms/astar.py):
+    w(e, t)  = length(e) / v_predicted(e)             if a prediction exists
+             = t₀(e) × [1 + α_bpr × (v/c)^β_bpr]      otherwise (BPR)
+    cost(e)  = α·T/60 + β·(length_km × EF(v))/100 + γ·length_km
+    h(n)     = haversine(n, goal) / v_max
+    f(n)     = g(n) + ε·h(n)                          (ε = 1: plain A*)
+with t₀ and length_km precomputed per edge, EF(v) read from EF_LUT and the
+BPR factor 1 + α_bpr × (v/c)^β_bpr taken from a per-hour table built once
+at import (astar.BPR_FACTOR_BY_HOUR), so no pow() runs per edge.
+_edge_weight is the single definition of w(e, t) and the edge speed;
+astar.get_traffic_overlay evaluates the same rule over arrays of path edges.
+
+_bidirectional_astar_core runs the same search from both endpoints over the
+forward and reverse (incoming-edge) CSR arrays and meets in the middle.
+
+The entry points are compiled with nogil=True and only touch their own
+arrays, so concurrent route requests run their searches in parallel
+threads over the shared, read-only CSR graph.
+"""
+
+import math
+
+import numpy as np
+from numba import njit
+
+from utils.haversine_numba import haversine_to_ref
+
+
+@njit(cache=True)
+def _heap_before(a, b, heap_key):
+    """Heap order on slots: smaller key first, ties by earlier push."""
+    return heap_key[a] < heap_key[b] or (heap_key[a] == heap_key[b] and a < b)
+
+
+@njit(cache=True)
+def _heap_push(heap, size, heap_key, slot):
+    """Sift slot up into the 4-ary min-heap heap[:size]; returns the new size.
+
+    Children of position i are 4i+1 … 4i+4, so the heap is log₄ n deep:
+    half the levels of a binary heap for each sift.
+    """
+    i = size
+    while i > 0:
+        parent = (i - 1) >> 2
+        if not _heap_before(slot, heap[parent], heap_key):
+            break
+        heap[i] = heap[parent]
+        i = parent
+    heap[i] = slot
+    return size + 1
+
+
+@njit(cache=True)
+def _heap_pop(heap, size, heap_key):
+    """Remove the minimum slot from heap[:size]; caller decrements size."""
+    top = heap[0]
+    size -= 1
+    last = heap[size]
+    i = 0
+    while True:
+        first = 4 * i + 1
+        if first >= size:
+            break
+        child = first
+        for c in range(first + 1, min(first + 4, size)):
+            if _heap_before(heap[c], heap[child], heap_key):
+                child = c
+        if not _heap_before(heap[child], last, heap_key):
+            break
+        heap[i] = heap[child]
+        i = child
+    heap[i] = last
+    return top
+
+
+@njit(cache=True)
+def _heuristic(node, h_cache, lat, lng, ref_lat, ref_lng, cos_ref, v_max_ms):
+    """h(node) = haversine(node, ref) / v_max, memoized in h_cache (NaN = unset)."""
+    h = h_cache[node]
+    if np.isnan(h):
+        h = haversine_to_ref(lat[node], lng[node], ref_lat, ref_lng, cos_ref) / v_max_ms
+        h_cache[node] = h
+    return h
+
+
+@njit(cache=True)
+def _edge_weight(
+    k, bpr_factor, length_m, length_km, free_flow_ms, t0_s,
+    capacity, pred_speed, alpha, beta, gamma, ef_lut,
+):
+    """Time-dependent weight of edge k for the hour's BPR factor 1 + α_bpr·(v/c)^β_bpr.
+
+    Returns (travel_time_s, speed_kmh, edge_cost).
+    """
+    length = length_m[k]
+
+    # Prediction override, else BPR on precomputed t₀
+    ps = pred_speed[k]
+    if ps > 0:
+        travel_time = length / (ps / 3.6)
+        speed = ps
+    else:
+        travel_time = t0_s[k] * (bpr_factor if capacity[k] > 0 else 1.0)
+        speed = length / travel_time * 3.6 if travel_time > 0 else free_flow_ms[k] * 3.6
+
+    # Multi-objective edge cost, EF interpolated from the lookup table
+    lut_max = len(ef_lut) - 1
+    x = min(speed, float(lut_max))
+    i = min(int(x), lut_max - 1)
+    ef = ef_lut[i] + (x - i) * (ef_lut[i + 1] - ef_lut[i])
+    edge_cost = (
+        alpha * (travel_time / 60.0)
+        + beta * (length_km[k] * ef / 100.0)
+        + gamma * length_km[k]
+    )
+    return travel_time, speed, edge_cost
+
+
+@njit(cache=True, nogil=True)
+def _astar_core(
+    indptr, indices, length_m, length_km, free_flow_ms, t0_s,
+    capacity, pred_speed, lat, lng,
+    start, goal, dep_t_sec,
+    alpha, beta, gamma,
+    bpr_factor_by_hour, v_max_ms, epsilon, ef_lut,
+    max_iterations,
+):
+    """Run the A* expansion loop.
+
+    Returns:
+        (path, path_edges, seg_time_s, seg_speed_kmh, cost, nodes_explored)
+        where path holds node indices from start to goal and the per-segment
+        arrays are aligned with path_edges. path is empty if no route exists.
+    """
+    # Goal trig hoisted out of the loop, h memoized per node
+    n = len(indptr) - 1
+    goal_lat = lat[goal]
+    goal_lng = lng[goal]
+    cos_goal = math.cos(math.radians(goal_lat))
+    h_cache = np.full(n, np.nan)
+    h_start = _heuristic(start, h_cache, lat, lng, goal_lat, goal_lng, cos_goal, v_max_ms)
+
+    # Open set: 4-ary heap of slot ids. Each push takes the next slot and
+    # stores its entry (f_cost, node, elapsed_s, g_cost) in the slot arrays,
+    # so slot order doubles as the insertion-order tie-break. Every edge is
+    # relaxed at most once (from its closed tail), bounding pushes by E + 1.
+    cap = len(indices) + 1
+    heap = np.empty(cap, dtype=np.int32)
+    slot_f = np.empty(cap)
+    slot_node = np.empty(cap, dtype=np.int32)
+    slot_elapsed = np.empty(cap)
+    slot_g = np.empty(cap)
+    slot_f[0] = epsilon * h_start
+    slot_node[0] = start
+    slot_elapsed[0] = 0.0
+    slot_g[0] = 0.0
+    heap[0] = 0
+    size = 1
+    n_slots = 1
+
+    # Per-node labels indexed by node (closed is the visited flag)
+    closed = np.zeros(n, dtype=np.uint8)
+    g_scores = np.full(n, np.inf)
+    parent = np.full(n, -1, dtype=np.int32)
+    parent_edge = np.full(n, -1, dtype=np.int32)
+    seg_time = np.zeros(n)
+    seg_speed = np.zeros(n)
+    g_scores[start] = 0.0
+
+    iterations = max_iterations
+    while size > 0 and iterations > 0:
+        iterations -= 1
+        slot = _heap_pop(heap, size, slot_f)
+        size -= 1
+        current = slot_node[slot]
+        elapsed = slot_elapsed[slot]
+        current_g = slot_g[slot]
+
+        if current == goal:
+            n_edges = 0
+            node = goal
+            while node != start:
+                n_edges += 1
+                node = parent[node]
+
+            path = np.empty(n_edges + 1, dtype=np.int32)
+            path_edges = np.empty(n_edges, dtype=np.int32)
+            times = np.empty(n_edges, dtype=np.float64)
+            speeds = np.empty(n_edges, dtype=np.float64)
+            node = goal
+            for i in range(n_edges - 1, -1, -1):
+                path[i + 1] = node
+                times[i] = seg_time[node]
+                speeds[i] = seg_speed[node]
+                path_edges[i] = parent_edge[node]
+                node = parent[node]
+            path[0] = start
+            return path, path_edges, times, speeds, current_g, max_iterations - iterations
+
+        if closed[current]:
+            continue
+        closed[current] = 1
+
+        bpr_factor = bpr_factor_by_hour[int((dep_t_sec + elapsed) / 3600.0) % 24]
+
+        for k in range(indptr[current], indptr[current + 1]):
+            neighbor = indices[k]
+            if closed[neighbor]:
+                continue
+
+            travel_time, speed, edge_cost = _edge_weight(
+                k, bpr_factor, length_m, length_km, free_flow_ms, t0_s,
+                capacity, pred_speed, alpha, beta, gamma, ef_lut,
+            )
+
+            g_new = current_g + edge_cost
+            if g_new < g_scores[neighbor]:
+                g_scores[neighbor] = g_new
+                parent[neighbor] = current
+                parent_edge[neighbor] = k
+                seg_time[neighbor] = travel_time
+                seg_speed[neighbor] = speed
+
+                h = _heuristic(neighbor, h_cache, lat, lng, goal_lat, goal_lng, cos_goal, v_max_ms)
+                slot_f[n_slots] = g_new + epsilon * h
+                slot_node[n_slots] = neighbor
+                slot_elapsed[n_slots] = elapsed + travel_time
+                slot_g[n_slots] = g_new
+                size = _heap_push(heap, size, slot_f, n_slots)
+                n_slots += 1
+
+    empty_i = np.empty(0, dtype=np.int32)
+    empty_f = np.empty(0, dtype=np.float64)
+    return empty_i, empty_i, empty_f, empty_f, np.inf, max_iterations - iterations
+
+
+@njit(cache=True, nogil=True)
+def _bidirectional_astar_core(
+    indptr, indices, rev_indptr, rev_sources, rev_edges,
+    length_m, length_km, free_flow_ms, t0_s,
+    capacity, pred_speed, lat, lng,
+    start, goal, dep_t_sec,
+    alpha, beta, gamma,
+    bpr_factor_by_hour, v_max_ms, epsilon, ef_lut,
+    max_iterations,
+):
+    """Run forward (from start) and backward (from goal) A* alternately.
+
+    Each step expands the direction whose open set has the smaller top f.
+    The forward search uses h(n) = haversine(n, goal) / v_max and
+    time-dependent weights; the backward search walks incoming edges with
+    h(n) = haversine(start, n) / v_max and, since arrival times are unknown
+    there, evaluates weights at the departure hour. Every relaxation that
+    reaches a node labelled by the other search yields a candidate path of
+    cost μ = g_fwd(n) + g_bwd(n); the search stops once
+    max(top_f_fwd, top_f_bwd) ≥ μ*. The joined path is then re-evaluated
+    forward in time, so the returned segment times, speeds and cost use
+    the same time-dependent weights as _astar_core.
+
+    Returns the same tuple as _astar_core.
+    """
+    bpr_factor_dep = bpr_factor_by_hour[int(dep_t_sec / 3600.0) % 24]
+
+    n = len(indptr) - 1
+    goal_lat = lat[goal]
+    goal_lng = lng[goal]
+    cos_goal = math.cos(math.radians(goal_lat))
+    start_lat = lat[start]
+    start_lng = lng[start]
+    cos_start = math.cos(math.radians(start_lat))
+    h_fwd = np.full(n, np.nan)
+    h_bwd = np.full(n, np.nan)
+
+    h_start = _heuristic(start, h_fwd, lat, lng, goal_lat, goal_lng, cos_goal, v_max_ms)
+
+    # Slot-array heaps as in _astar_core, one per direction
+    cap = len(indices) + 1
+    heap_fwd = np.empty(cap, dtype=np.int32)
+    f_fwd = np.empty(cap)
+    node_fwd = np.empty(cap, dtype=np.int32)
+    elapsed_fwd = np.empty(cap)
+    gs_fwd = np.empty(cap)
+    f_fwd[0] = epsilon * h_start
+    node_fwd[0] = start
+    elapsed_fwd[0] = 0.0
+    gs_fwd[0] = 0.0
+    heap_fwd[0] = 0
+    size_fwd = 1
+    slots_fwd = 1
+
+    heap_bwd = np.empty(cap, dtype=np.int32)
+    f_bwd = np.empty(cap)
+    node_bwd = np.empty(cap, dtype=np.int32)
+    gs_bwd = np.empty(cap)
+    f_bwd[0] = epsilon * h_start
+    node_bwd[0] = goal
+    gs_bwd[0] = 0.0
+    heap_bwd[0] = 0
+    size_bwd = 1
+    slots_bwd = 1
+
+    g_fwd = np.full(n, np.inf)
+    g_bwd = np.full(n, np.inf)
+    parent = np.full(n, -1, dtype=np.int32)       # forward: predecessor
+    parent_edge = np.full(n, -1, dtype=np.int32)
+    child = np.full(n, -1, dtype=np.int32)        # backward: successor
+    child_edge = np.full(n, -1, dtype=np.int32)
+    closed_fwd = np.zeros(n, dtype=np.uint8)
+    closed_bwd = np.zeros(n, dtype=np.uint8)
+    g_fwd[start] = 0.0
+    g_bwd[goal] = 0.0
+
+    best = np.inf
+    meet = -1
+    if start == goal:
+        best = 0.0
+        meet = start
+
+    iterations = max_iterations
+    while size_fwd > 0 and size_bwd > 0 and iterations > 0:
+        top_fwd = f_fwd[heap_fwd[0]]
+        top_bwd = f_bwd[heap_bwd[0]]
+        if max(top_fwd, top_bwd) >= best:
+            break
+        iterations -= 1
+
+        if top_fwd <= top_bwd:
+            slot = _heap_pop(heap_fwd, size_fwd, f_fwd)
+            size_fwd -= 1
+            current = node_fwd[slot]
+            elapsed = elapsed_fwd[slot]
+            current_g = gs_fwd[slot]
+            if closed_fwd[current]:
+                continue
+            closed_fwd[current] = 1
+
+            bpr_factor = bpr_factor_by_hour[int((dep_t_sec + elapsed) / 3600.0) % 24]
+
+            for k in range(indptr[current], indptr[current + 1]):
+                neighbor = indices[k]
+                if closed_fwd[neighbor]:
+                    continue
+                travel_time, _, edge_cost = _edge_weight(
+                    k, bpr_factor, length_m, length_km, free_flow_ms, t0_s,
+                    capacity, pred_speed, alpha, beta, gamma, ef_lut,
+                )
+                g_new = current_g + edge_cost
+                if g_new < g_fwd[neighbor]:
+                    g_fwd[neighbor] = g_new
+                    parent[neighbor] = current
+                    parent_edge[neighbor] = k
+                    if g_new + g_bwd[neighbor] < best:
+                        best = g_new + g_bwd[neighbor]
+                        meet = neighbor
+
+                    h = _heuristic(neighbor, h_fwd, lat, lng, goal_lat, goal_lng, cos_goal, v_max_ms)
+                    f_fwd[slots_fwd] = g_new + epsilon * h
+                    node_fwd[slots_fwd] = neighbor
+                    elapsed_fwd[slots_fwd] = elapsed + travel_time
+                    gs_fwd[slots_fwd] = g_new
+                    size_fwd = _heap_push(heap_fwd, size_fwd, f_fwd, slots_fwd)
+                    slots_fwd += 1
+        else:
+            slot = _heap_pop(heap_bwd, size_bwd, f_bwd)
+            size_bwd -= 1
+            current = node_bwd[slot]
+            current_g = gs_bwd[slot]
+            if closed_bwd[current]:
+                continue
+            closed_bwd[current] = 1
+
+            for r in range(rev_indptr[current], rev_indptr[current + 1]):
+                k = rev_edges[r]
+                neighbor = rev_sources[r]
+                if closed_bwd[neighbor]:
+                    continue
+                _, _, edge_cost = _edge_weight(
+                    k, bpr_factor_dep, length_m, length_km, free_flow_ms, t0_s,
+                    capacity, pred_speed, alpha, beta, gamma, ef_lut,
+                )
+                g_new = current_g + edge_cost
+                if g_new < g_bwd[neighbor]:
+                    g_bwd[neighbor] = g_new
+                    child[neighbor] = current
+                    child_edge[neighbor] = k
+                    if g_new + g_fwd[neighbor] < best:
+                        best = g_new + g_fwd[neighbor]
+                        meet = neighbor
+
+                    h = _heuristic(neighbor, h_bwd, lat, lng, start_lat, start_lng, cos_start, v_max_ms)
+                    f_bwd[slots_bwd] = g_new + epsilon * h
+                    node_bwd[slots_bwd] = neighbor
+                    gs_bwd[slots_bwd] = g_new
+                    size_bwd = _heap_push(heap_bwd, size_bwd, f_bwd, slots_bwd)
+                    slots_bwd += 1
+
+    nodes_explored = max_iterations - iterations
+    if meet < 0:
+        empty_i = np.empty(0, dtype=np.int32)
+        empty_f = np.empty(0, dtype=np.float64)
+        return empty_i, empty_i, empty_f, empty_f, np.inf, nodes_explored
+
+    # Join start → meet (forward labels) with meet → goal (backward labels)
+    n_fwd = 0
+    node = meet
+    while node != start:
+        n_fwd += 1
+        node = parent[node]
+    n_bwd = 0
+    node = meet
+    while node != goal:
+        n_bwd += 1
+        node = child[node]
+
+    n_edges = n_fwd + n_bwd
+    path = np.empty(n_edges + 1, dtype=np.int32)
+    path_edges = np.empty(n_edges, dtype=np.int32)
+    node = meet
+    path[n_fwd] = meet
+    for i in range(n_fwd - 1, -1, -1):
+        path_edges[i] = parent_edge[node]
+        node = parent[node]
+        path[i] = node
+    node = meet
+    for i in range(n_fwd, n_edges):
+        path_edges[i] = child_edge[node]
+        node = child[node]
+        path[i + 1] = node
+
+    # Re-evaluate the joined path forward in time
+    times = np.empty(n_edges, dtype=np.float64)
+    speeds = np.empty(n_edges, dtype=np.float64)
+    elapsed = 0.0
+    cost = 0.0
+    for i in range(n_edges):
+        travel_time, speed, edge_cost = _edge_weight(
+            path_edges[i], bpr_factor_by_hour[int((dep_t_sec + elapsed) / 3600.0) % 24],
+            length_m, length_km, free_flow_ms, t0_s,
+            capacity, pred_speed, alpha, beta, gamma, ef_lut,
+        )
+        times[i] = travel_time
+        speeds[i] = speed
+        cost += edge_cost
+        elapsed += travel_time
+    return path, path_edges, times, speeds, cost, nodes_explored
+
+
+@njit(cache=True, nogil=True)
+def _find_edges(indptr, indices, us, vs):
+    """CSR edge id of each (us[i] → vs[i]) pair, -1 where no such edge exists."""
+    out = np.full(len(us), -1, dtype=np.int32)
+    for i in range(len(us)):
+        u = us[i]
+        if u < 0 or vs[i] < 0:
+            continue
+        for k in range(indptr[u], indptr[u + 1]):
+            if indices[k] == vs[i]:
+                out[i] = k
+                break
+    return out
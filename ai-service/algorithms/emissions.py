@@ -14,28 +14,79 @@ Carpool savings:
     percentage_saved = CO₂_saved / Σᵢ (dᵢ × EF(vᵢ)) × 100
 """
 
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
+import numpy as np
 from config import emission_config
 
 
+# g CO₂ per liter of fuel by fuel type (electric: no direct emissions)
+CO2_PER_LITER_BY_FUEL: Dict[str, float] = {
+    "petrol": 2310.0,
+    "diesel": 2680.0,
+    "hybrid": 2310.0 * 0.5,
+    "electric": 0.0,
+}
+
+
 def fuel_consumption(speed_kmh: float) -> float:
     """Calculate fuel consumption in L/km using simplified COPERT model.
 
     fuel_consumption(v) = 0.0667 + 0.0556/v + 0.000472·v²  [L/km]
     """
-    v = max(speed_kmh, 5.0)  # Avoid division by zero, minimum 5 km/h
-    fc = emission_config.fuel_a + emission_config.fuel_b / v + emission_config.fuel_c * v ** 2
-    return max(fc, 0.01)  # Minimum consumption
+    v = speed_kmh if speed_kmh > 5.0 else 5.0  # Avoid division by zero, minimum 5 km/h
+    fc = emission_config.fuel_a + emission_config.fuel_b / v + emission_config.fuel_c * (v * v)
+    return fc if fc > 0.01 else 0.01  # Minimum consumption
+
+
+def _fuel_consumptions(speeds_kmh: np.ndarray) -> np.ndarray:
+    """fuel_consumption over an array of speeds in one Horner pass: fc(v) = polyval(v) / v."""
+    v = np.maximum(speeds_kmh, 5.0)
+    return np.maximum(np.polyval(emission_config.fuel_poly, v) / v, 0.01)
+
+
+# Lookup tables at integer speeds v = 0..256 km/h. Lookups interpolate
+# linearly between neighbouring entries; speeds above 256 km/h use the formula
+# itself. The interpolation error peaks at 0.22% of the exact formula around
+# 5.5 km/h, where the b/v term curves most just above the 5 km/h clamp, and
+# stays below 0.05% from 20 km/h up.
+EF_LUT_MAX_KMH = 256
+_LUT_SPEEDS = np.arange(EF_LUT_MAX_KMH + 1, dtype=np.float64)
+_FC_TABLE = _fuel_consumptions(_LUT_SPEEDS)
+
+# EF_LUT[v] = EF(v) with the configured CO₂/L, as float32 for the A* kernel
+# (which clamps at EF_LUT_MAX_KMH, far above any road speed)
+EF_LUT = (emission_config.co2_per_liter * _FC_TABLE).astype(np.float32)
+_EF_LUT_BY_FUEL: Dict[str, np.ndarray] = {
+    fuel: co2 * _FC_TABLE for fuel, co2 in CO2_PER_LITER_BY_FUEL.items()
+}
+
+# Plain-list copies for scalar lookups (list indexing beats ndarray indexing)
+_EF_TABLE = (emission_config.co2_per_liter * _FC_TABLE).tolist()
+_EF_TABLE_BY_FUEL: Dict[str, List[float]] = {
+    fuel: table.tolist() for fuel, table in _EF_LUT_BY_FUEL.items()
+}
+
+
+def _interp_table(table: List[float], co2_per_liter: float, speed_kmh: float) -> float:
+    """Linearly interpolate a per-integer-speed EF table at speed_kmh.
+
+    Above EF_LUT_MAX_KMH the table ends, so EF = co2_per_liter × fuel_consumption(v).
+    """
+    x = speed_kmh if speed_kmh > 0.0 else 0.0
+    if x >= EF_LUT_MAX_KMH:
+        return co2_per_liter * fuel_consumption(x)
+    i = int(x)
+    lo = table[i]
+    return lo + (x - i) * (table[i + 1] - lo)
 
 
 def emission_factor(speed_kmh: float) -> float:
     """Calculate emission factor in g CO₂/km.
 
     EF(v) = 2310 × fuel_consumption(v)  [g CO₂/km]
+    Read from the precomputed speed table instead of evaluating the polynomial.
     """
-    fc = fuel_consumption(speed_kmh)
-    ef = emission_config.co2_per_liter * fc
-    return ef
+    return _interp_table(_EF_TABLE, emission_config.co2_per_liter, speed_kmh)
 
 
 def emission_factor_by_fuel_type(speed_kmh: float, fuel_type: str = "petrol") -> float:
@@ -49,17 +100,29 @@ def emission_factor_by_fuel_type(speed_kmh: float, fuel_type: str = "petrol") ->
     if fuel_type == "electric":
         return 0.0
 
-    v = max(speed_kmh, 5.0)
-    fc = emission_config.fuel_a + emission_config.fuel_b / v + emission_config.fuel_c * v ** 2
-    fc = max(fc, 0.01)
+    if fuel_type not in _EF_TABLE_BY_FUEL:
+        fuel_type = "petrol"
+    return _interp_table(_EF_TABLE_BY_FUEL[fuel_type], CO2_PER_LITER_BY_FUEL[fuel_type], speed_kmh)
 
-    co2_per_liter = {
-        "petrol": 2310.0,
-        "diesel": 2680.0,
-        "hybrid": 2310.0 * 0.5,
-    }.get(fuel_type, 2310.0)
 
-    return co2_per_liter * fc
+def emission_factors(speeds_kmh: np.ndarray, fuel_type: str = "petrol") -> np.ndarray:
+    """Vectorized emission_factor_by_fuel_type over an array of speeds."""
+    speeds_kmh = np.asarray(speeds_kmh, dtype=np.float64)
+    if fuel_type not in _EF_LUT_BY_FUEL:
+        fuel_type = "petrol"
+    ef = np.interp(speeds_kmh, _LUT_SPEEDS, _EF_LUT_BY_FUEL[fuel_type])
+    fast = speeds_kmh > EF_LUT_MAX_KMH
+    if fast.any():
+        ef[fast] = CO2_PER_LITER_BY_FUEL[fuel_type] * _fuel_consumptions(speeds_kmh[fast])
+    return ef
+
+
+def _segments_to_arrays(segments: List[Dict[str, float]]) -> Tuple[np.ndarray, np.ndarray]:
+    """Unpack segment dicts into (distances_km, speeds_kmh) arrays."""
+    n = len(segments)
+    distances = np.fromiter((s.get("distanceKm", 0.0) for s in segments), np.float64, n)
+    speeds = np.fromiter((s.get("avgSpeedKmh", 30.0) for s in segments), np.float64, n)
+    return distances, speeds
 
 
 def calculate_ride_emissions(
@@ -77,13 +140,10 @@ def calculate_ride_emissions(
     Returns:
         Total CO₂ in grams
     """
-    total_co2 = 0.0
-    for seg in segments:
-        distance_km = seg.get("distanceKm", 0.0)
-        avg_speed = seg.get("avgSpeedKmh", 30.0)
-        ef = emission_factor_by_fuel_type(avg_speed, fuel_type)
-        total_co2 += distance_km * ef
-    return total_co2
+    if not segments:
+        return 0.0
+    distances, speeds = _segments_to_arrays(segments)
+    return float(np.dot(distances, emission_factors(speeds, fuel_type)))
 
 
 def calculate_carpool_savings(
@@ -103,12 +163,7 @@ def calculate_carpool_savings(
     Returns:
         {"co2_saved_g": float, "percentage_saved": float, "individual_total_g": float, "shared_total_g": float}
     """
-    individual_total = 0.0
-    for trip in individual_trips:
-        d = trip.get("distanceKm", 0.0)
-        v = trip.get("avgSpeedKmh", 30.0)
-        ef = emission_factor_by_fuel_type(v, fuel_type)
-        individual_total += d * ef
+    individual_total = calculate_ride_emissions(individual_trips, fuel_type)
 
     shared_d = shared_trip.get("distanceKm", 0.0)
     shared_v = shared_trip.get("avgSpeedKmh", 30.0)
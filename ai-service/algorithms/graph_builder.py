@@ -12,9 +12,13 @@ Uses Overpass API to download road data for a configurable bounding box.
 
 import math
 import httpx
+import numpy as np
+import orjson
 import networkx as nx
+from dataclasses import dataclass
 from typing import Dict, Any, Optional, Tuple, List
 from utils.haversine import haversine
+from utils.haversine_numba import haversine_a_vec
 from config import graph_config
 
 OVERPASS_URL = "https://overpass-api.de/api/interpreter"
@@ -52,6 +56,42 @@ ROAD_LANES: Dict[str, int] = {
 # Capacity per lane per hour
 CAPACITY_PER_LANE_HOUR = 1800
 
+# Compact road type ids for the CSR arrays (unknown types map to unclassified)
+ROAD_TYPES: List[str] = list(ROAD_SPEED_LIMITS)
+ROAD_TYPE_TO_ID: Dict[str, int] = {road_type: i for i, road_type in enumerate(ROAD_TYPES)}
+
+
+@dataclass
+class CSRGraph:
+    """Compressed sparse row (CSR) view of the road graph for routing hot loops.
+
+    Nodes are renumbered 0..N-1 (node_ids[i] is the original OSM id of index i).
+    The outgoing edges of node i are k = indptr[i] .. indptr[i+1]-1, with head
+    node indices[k] and attributes in the parallel per-edge arrays.
+    """
+    node_ids: np.ndarray       # int64[N]   index → OSM node id
+    node_index: Dict[int, int] # OSM node id → index
+    lat: np.ndarray            # float64[N]
+    lng: np.ndarray            # float64[N]
+    indptr: np.ndarray         # int32[N+1]
+    indices: np.ndarray        # int32[E]
+    length_m: np.ndarray       # float32[E]
+    length_km: np.ndarray      # float32[E]
+    free_flow_ms: np.ndarray   # float32[E]
+    t0_s: np.ndarray           # float32[E]  free-flow travel time length/free_flow (inf if no speed)
+    capacity: np.ndarray       # float32[E]
+    road_type: np.ndarray      # uint8[E]   index into ROAD_TYPES
+    lanes: np.ndarray          # uint8[E]
+    osm_way_id: np.ndarray     # int64[E]   for result serialization only
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.node_ids)
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.indices)
+
 
 def build_overpass_query(bbox: Tuple[float, float, float, float]) -> str:
     """Build Overpass QL query for road network.
@@ -78,7 +118,7 @@ async def fetch_osm_data(bbox: Tuple[float, float, float, float]) -> Dict[str, A
         async with httpx.AsyncClient(timeout=120.0) as client:
             response = await client.post(OVERPASS_URL, data={"data": query})
             response.raise_for_status()
-            return response.json()
+            return orjson.loads(response.content)
     except Exception as e:
         print(f"[GraphBuilder] Overpass API error: {e}")
         return {"elements": []}
@@ -114,25 +154,14 @@ def build_graph_from_osm_data(osm_data: Dict[str, Any]) -> nx.DiGraph:
     G = nx.DiGraph()
     elements = osm_data.get("elements", [])
 
-    # Separate nodes and ways
-    nodes: Dict[int, Dict[str, float]] = {}
+    # Add nodes straight into the graph; ways are kept for the edge pass
     ways: List[Dict[str, Any]] = []
-
     for el in elements:
         if el["type"] == "node":
-            nodes[el["id"]] = {"lat": el["lat"], "lon": el["lon"]}
+            G.add_node(el["id"], lat=el["lat"], lng=el["lon"])
         elif el["type"] == "way":
             ways.append(el)
-
-    # Count node references to identify intersections
-    node_refs: Dict[int, int] = {}
-    for way in ways:
-        for node_id in way.get("nodes", []):
-            node_refs[node_id] = node_refs.get(node_id, 0) + 1
-
-    # Add nodes to graph
-    for node_id, coords in nodes.items():
-        G.add_node(node_id, lat=coords["lat"], lng=coords["lon"])
+    nodes = G._node
 
     # Add edges from ways
     for way in ways:
@@ -152,8 +181,8 @@ def build_graph_from_osm_data(osm_data: Dict[str, Any]) -> nx.DiGraph:
             if n1 not in nodes or n2 not in nodes:
                 continue
 
-            lat1, lng1 = nodes[n1]["lat"], nodes[n1]["lon"]
-            lat2, lng2 = nodes[n2]["lat"], nodes[n2]["lon"]
+            lat1, lng1 = nodes[n1]["lat"], nodes[n1]["lng"]
+            lat2, lng2 = nodes[n2]["lat"], nodes[n2]["lng"]
 
             length_m = haversine(lat1, lng1, lat2, lng2)
 
@@ -175,6 +204,9 @@ def build_graph_from_osm_data(osm_data: Dict[str, Any]) -> nx.DiGraph:
             if not oneway:
                 G.add_edge(n2, n1, **edge_attrs)
 
+    G.graph["csr"] = build_csr(G)
+    G.graph["csr_rev"] = build_reverse_csr(G.graph["csr"])
+
     print(f"[GraphBuilder] Graph built: {G.number_of_nodes()} nodes, {G.number_of_edges()} edges")
     return G
 
@@ -223,6 +255,7 @@ def build_synthetic_graph(
             node_id += 1
 
     # Create edges (grid connections + some diagonals)
+    nodes = G._node
     road_types = ["primary", "secondary", "tertiary", "residential"]
     for i in range(grid_size):
         for j in range(grid_size):
@@ -238,10 +271,10 @@ def build_synthetic_graph(
 
             for (ni, nj), road_type in neighbors:
                 n2 = node_grid[(ni, nj)]
-                lat1 = G.nodes[n1]["lat"]
-                lng1 = G.nodes[n1]["lng"]
-                lat2 = G.nodes[n2]["lat"]
-                lng2 = G.nodes[n2]["lng"]
+                lat1 = nodes[n1]["lat"]
+                lng1 = nodes[n1]["lng"]
+                lat2 = nodes[n2]["lat"]
+                lng2 = nodes[n2]["lng"]
                 length_m = haversine(lat1, lng1, lat2, lng2)
                 speed_limit = ROAD_SPEED_LIMITS.get(road_type, 40.0)
                 lanes = ROAD_LANES.get(road_type, 1)
@@ -259,17 +292,117 @@ def build_synthetic_graph(
                 G.add_edge(n1, n2, **edge_attrs)
                 G.add_edge(n2, n1, **edge_attrs)
 
+    G.graph["csr"] = build_csr(G)
+    G.graph["csr_rev"] = build_reverse_csr(G.graph["csr"])
+
     print(f"[GraphBuilder] Synthetic graph: {G.number_of_nodes()} nodes, {G.number_of_edges()} edges")
     return G
 
 
+def build_csr(G: nx.DiGraph) -> CSRGraph:
+    """Flatten a NetworkX road graph into contiguous CSR arrays.
+
+    Edges are grouped by source node in node-iteration order, so indptr is
+    filled in a single pass without sorting.
+    """
+    # NetworkX's backing dicts, bound once to skip the view layer per access
+    g_node = G._node
+    g_succ = G._succ
+    node_ids = list(g_node)
+    node_index = {node_id: i for i, node_id in enumerate(node_ids)}
+
+    indptr = [0]
+    indices: List[int] = []
+    length_m: List[float] = []
+    free_flow_ms: List[float] = []
+    capacity: List[float] = []
+    road_type: List[int] = []
+    lanes: List[int] = []
+    osm_way_id: List[int] = []
+    unclassified = ROAD_TYPE_TO_ID["unclassified"]
+
+    for u in node_ids:
+        for v, data in g_succ[u].items():
+            indices.append(node_index[v])
+            length_m.append(data["length_m"])
+            free_flow_kmh = data.get("free_flow_speed_kmh", data.get("speed_limit_kmh", 40.0))
+            free_flow_ms.append(free_flow_kmh / 3.6)
+            capacity.append(data.get("capacity", 1800))
+            road_type.append(ROAD_TYPE_TO_ID.get(data.get("road_type"), unclassified))
+            lanes.append(data.get("lanes", 1))
+            osm_way_id.append(data.get("osm_way_id", 0))
+        indptr.append(len(indices))
+
+    length_arr = np.asarray(length_m, dtype=np.float64)
+    free_flow_arr = np.asarray(free_flow_ms, dtype=np.float64)
+
+    # Edge invariants precomputed once instead of per expansion
+    t0_s = np.full(len(length_arr), np.inf)
+    np.divide(length_arr, free_flow_arr, out=t0_s, where=free_flow_arr > 0)
+
+    return CSRGraph(
+        node_ids=np.asarray(node_ids, dtype=np.int64),
+        node_index=node_index,
+        lat=np.asarray([g_node[n]["lat"] for n in node_ids], dtype=np.float64),
+        lng=np.asarray([g_node[n]["lng"] for n in node_ids], dtype=np.float64),
+        indptr=np.asarray(indptr, dtype=np.int32),
+        indices=np.asarray(indices, dtype=np.int32),
+        length_m=length_arr.astype(np.float32),
+        length_km=(length_arr / 1000.0).astype(np.float32),
+        free_flow_ms=free_flow_arr.astype(np.float32),
+        t0_s=t0_s.astype(np.float32),
+        capacity=np.asarray(capacity, dtype=np.float32),
+        road_type=np.asarray(road_type, dtype=np.uint8),
+        lanes=np.clip(lanes, 0, 255).astype(np.uint8),
+        osm_way_id=np.asarray(osm_way_id, dtype=np.int64),
+    )
+
+
+def get_csr(G: nx.DiGraph) -> CSRGraph:
+    """Return the CSR view attached to G, building it on first use."""
+    csr = G.graph.get("csr")
+    if csr is None:
+        csr = build_csr(G)
+        G.graph["csr"] = csr
+    return csr
+
+
+def get_reverse_csr(G: nx.DiGraph) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Return the reverse CSR arrays attached to G, building them on first use."""
+    rev = G.graph.get("csr_rev")
+    if rev is None:
+        rev = build_reverse_csr(get_csr(G))
+        G.graph["csr_rev"] = rev
+    return rev
+
+
+def build_reverse_csr(csr: CSRGraph) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Build the incoming-edge (transposed) adjacency of a CSR graph.
+
+    Returns (rev_indptr, rev_sources, rev_edges): the edges entering node v
+    are rev_edges[rev_indptr[v]:rev_indptr[v + 1]] (forward edge ids, so the
+    per-edge attribute arrays are shared) and rev_sources holds their tails.
+    """
+    n = csr.num_nodes
+    sources = np.repeat(np.arange(n, dtype=np.int32), np.diff(csr.indptr))
+    order = np.argsort(csr.indices, kind="stable")
+
+    rev_indptr = np.zeros(n + 1, dtype=np.int32)
+    np.cumsum(np.bincount(csr.indices, minlength=n), out=rev_indptr[1:])
+    return rev_indptr, sources[order], order.astype(np.int32)
+
+
 def find_nearest_node(G: nx.DiGraph, lat: float, lng: float) -> Optional[int]:
-    """Find the nearest graph node to given coordinates."""
-    min_dist = float("inf")
-    nearest = None
-    for node_id, data in G.nodes(data=True):
-        d = haversine(lat, lng, data["lat"], data["lng"])
-        if d < min_dist:
-            min_dist = d
-            nearest = node_id
-    return nearest
+    """Find the nearest graph node to given coordinates.
+
+    Evaluated over the CSR coordinate arrays with the compiled haversine_a_vec.
+    Only the haversine term a = sin²(Δφ/2) + cos(φ₁)·cos(φ₂)·sin²(Δλ/2) is
+    computed: the distance 2R·arctan2(√a, √(1−a)) is monotonic in a, so
+    argmin(a) is the nearest node.
+    """
+    if G.number_of_nodes() == 0:
+        return None
+    csr = get_csr(G)
+
+    a = haversine_a_vec(lat, lng, csr.lat, csr.lng, np.empty(csr.num_nodes))
+    return int(csr.node_ids[np.argmin(a)])
@@ -20,22 +20,91 @@ Step 4: Re-route driver through accepted pickups/dropoffs (TSP with nearest-neig
 
 import numpy as np
 from sklearn.cluster import DBSCAN
+from sklearn.neighbors import BallTree
+from sklearn.metrics.pairwise import haversine_distances
 from typing import List, Dict, Any, Optional, Tuple
-from datetime import datetime
-from utils.haversine import haversine, haversine_km
+from datetime import datetime, timezone
+import math
+from utils.haversine import haversine_rad, EARTH_RADIUS_M
+from utils.haversine_numba import haversine_pairwise
+from algorithms.matching_numba import (
+    _cumulative_length,
+    _project_vertex,
+    _route_overlap,
+    _route_overlaps,
+    _nn_tsp,
+    _two_opt,
+)
 from config import matching_config
 
+EARTH_RADIUS_KM = EARTH_RADIUS_M / 1000.0
+
+# Below this many points DBSCAN runs on the precomputed distance matrix;
+# above it, on a haversine ball tree (O(n) memory instead of O(n²))
+DBSCAN_BALL_TREE_MIN_POINTS = 32
+
+# ε of the proximity score: pickups this far from the route score 0
+PROXIMITY_EPSILON_M = 2000.0
+
 
 def haversine_distance_matrix(points: List[Tuple[float, float]]) -> np.ndarray:
-    """Compute pairwise Haversine distance matrix in km."""
-    n = len(points)
-    dist_matrix = np.zeros((n, n))
-    for i in range(n):
-        for j in range(i + 1, n):
-            d = haversine_km(points[i][0], points[i][1], points[j][0], points[j][1])
-            dist_matrix[i][j] = d
-            dist_matrix[j][i] = d
-    return dist_matrix
+    """Compute pairwise Haversine distance matrix in km.
+
+    Evaluated by the compiled utils.haversine_numba.haversine_pairwise kernel
+    (each pair once).
+    """
+    if len(points) == 0:
+        return np.zeros((0, 0))
+    lat, lng = _polyline_arrays(points)
+    return haversine_pairwise(lat, lng) / 1000.0
+
+
+def equirect_distance_matrix(points: List[Tuple[float, float]]) -> np.ndarray:
+    """Pairwise equirectangular distance matrix in meters.
+
+    x = R·λ·cos(φ_ref), y = R·φ with φ_ref the mean latitude; d = √(Δx² + Δy²).
+    Only for points within a city, e.g. the stops of one trip.
+    """
+    pts = np.radians(np.asarray(points, dtype=np.float64).reshape(-1, 2))
+    if len(pts) == 0:
+        return np.zeros((0, 0))
+    cos_ref = np.cos(pts[:, 0].mean())
+    x = EARTH_RADIUS_M * cos_ref * pts[:, 1]
+    y = EARTH_RADIUS_M * pts[:, 0]
+    return np.hypot(x[:, None] - x[None, :], y[:, None] - y[None, :])
+
+
+def _dbscan_subsampled(pts_rad: np.ndarray, eps_rad: float, min_pts: int) -> np.ndarray:
+    """DBSCAN++: density is estimated only at a uniform subsample of m points.
+
+    m = min(n, max(500, 20·√n)). A sampled point is core if its ε-ball over
+    the full set holds ≥ MinPts points; core points within ε of each other
+    share a cluster, and every point takes the cluster of its nearest core
+    point if that is within ε (else noise). O(m·n) instead of O(n²).
+    """
+    n = len(pts_rad)
+    m = min(n, max(500, int(np.sqrt(n) * 20)))
+    sample = np.random.default_rng(0).choice(n, size=m, replace=False)
+
+    tree = BallTree(pts_rad, metric="haversine")
+    counts = tree.query_radius(pts_rad[sample], eps_rad, count_only=True)
+    core = sample[counts >= min_pts]
+
+    labels = np.full(n, -1, dtype=np.int64)
+    if len(core) == 0:
+        return labels
+
+    core_labels = DBSCAN(
+        eps=eps_rad,
+        min_samples=1,
+        metric="haversine",
+        algorithm="ball_tree",
+    ).fit(pts_rad[core]).labels_
+
+    dist, idx = BallTree(pts_rad[core], metric="haversine").query(pts_rad, k=1)
+    within = dist[:, 0] <= eps_rad
+    labels[within] = core_labels[idx[within, 0]]
+    return labels
 
 
 def dbscan_cluster_pickups(
@@ -51,6 +120,11 @@ def dbscan_cluster_pickups(
 
     Core point p: |{q ∈ D : haversine(p,q) ≤ ε}| ≥ MinPts
 
+    Small inputs use a precomputed distance matrix; larger ones let sklearn
+    query a haversine BallTree with ε expressed in radians (ε / R). Above
+    matching_config.dbscan_subsample_threshold points, DBSCAN++ core-point
+    subsampling is used (see _dbscan_subsampled).
+
     Args:
         pickup_points: list of {"lat": float, "lng": float}
         eps_km: epsilon in km
@@ -63,107 +137,157 @@ def dbscan_cluster_pickups(
         return [-1] * len(pickup_points)
 
     points = [(p["lat"], p["lng"]) for p in pickup_points]
-    dist_matrix = haversine_distance_matrix(points)
 
-    clustering = DBSCAN(
-        eps=eps_km,
-        min_samples=min_pts,
-        metric="precomputed",
-    ).fit(dist_matrix)
+    if len(points) < DBSCAN_BALL_TREE_MIN_POINTS:
+        clustering = DBSCAN(
+            eps=eps_km,
+            min_samples=min_pts,
+            metric="precomputed",
+        ).fit(haversine_distance_matrix(points))
+    elif len(points) > matching_config.dbscan_subsample_threshold:
+        pts_rad = np.radians(np.asarray(points, dtype=np.float64))
+        return _dbscan_subsampled(pts_rad, eps_km / EARTH_RADIUS_KM, min_pts).tolist()
+    else:
+        clustering = DBSCAN(
+            eps=eps_km / EARTH_RADIUS_KM,
+            min_samples=min_pts,
+            metric="haversine",
+            algorithm="ball_tree",
+        ).fit(np.radians(np.asarray(points, dtype=np.float64)))
 
     return clustering.labels_.tolist()
 
 
-def project_point_on_polyline(
-    point: Tuple[float, float],
-    polyline: List[List[float]],
-) -> Tuple[int, float]:
-    """Project a point onto the nearest segment of a polyline.
+def _polyline_arrays(polyline: List[List[float]]) -> Tuple[np.ndarray, np.ndarray]:
+    """Split a [[lat, lng], ...] polyline into contiguous lat and lng arrays."""
+    arr = np.asarray(polyline, dtype=np.float64).reshape(-1, 2)
+    return np.ascontiguousarray(arr[:, 0]), np.ascontiguousarray(arr[:, 1])
 
-    Returns (segment_index, distance_from_start_m).
+
+def _prepare_ride(ride: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Return (lat, lng, cumulative_length_m) arrays of a ride's polyline.
+
+    The ride dict is only read, never annotated. Coordinates stay float64:
+    float32 rounds a coordinate by up to ~0.5 m here, enough to move the 4th
+    decimal of a proximity score.
+    """
+    lat, lng = _polyline_arrays(ride.get("polyline", []))
+    return lat, lng, _cumulative_length(lat, lng)
+
+
+def _polyline_enu(phi: np.ndarray, lam: np.ndarray) -> Tuple[np.ndarray, np.ndarray, float, float, float]:
+    """Return (x, y, φ₀, λ₀, cos0): a polyline (radians) in a local tangent plane.
+
+    x = R·cos(φ₀)·(λ − λ₀), y = R·(φ − φ₀)  [m], origin (φ₀, λ₀) at the
+    middle vertex, so a distance in the plane is the equirectangular
+    distance with that vertex as reference.
     """
-    min_dist = float("inf")
-    best_idx = 0
-    cumulative_dist = 0.0
-    best_cumulative = 0.0
+    if len(phi):
+        phi0, lam0 = phi[len(phi) // 2], lam[len(phi) // 2]
+    else:
+        phi0, lam0 = 0.0, 0.0
+    cos0 = np.cos(phi0)
+    x = EARTH_RADIUS_M * cos0 * (lam - lam0)
+    y = EARTH_RADIUS_M * (phi - phi0)
+    return x, y, phi0, lam0, cos0
+
+
+def _min_distances(enus: List[Tuple], pickup_rad: np.ndarray) -> np.ndarray:
+    """Distance in meters from a pickup to the nearest vertex of each polyline.
+
+    enus are _polyline_enu tuples; the pickup (radians) is placed in each
+    polyline's own tangent plane, so the distance is the equirectangular
+    distance with the polyline's middle vertex as reference. inf for an
+    empty polyline. The per-polyline minima are taken with np.minimum.reduceat.
+    """
+    lengths = np.array([len(e[0]) for e in enus], dtype=np.int64)
+    min_dist = np.full(len(enus), np.inf)
+    nonempty = lengths > 0
+    if not nonempty.any():
+        return min_dist
+
+    kept = [e for e, keep in zip(enus, nonempty) if keep]
+    phi0 = np.array([e[2] for e in kept])
+    lam0 = np.array([e[3] for e in kept])
+    cos0 = np.array([e[4] for e in kept])
+    px = EARTH_RADIUS_M * cos0 * (pickup_rad[1] - lam0)
+    py = EARTH_RADIUS_M * (pickup_rad[0] - phi0)
+    counts = lengths[nonempty]
+    starts = np.zeros(len(counts), dtype=np.int64)
+    np.cumsum(counts[:-1], out=starts[1:])
+    dists = np.hypot(
+        np.concatenate([e[0] for e in kept]) - np.repeat(px, counts),
+        np.concatenate([e[1] for e in kept]) - np.repeat(py, counts),
+    )
+    min_dist[nonempty] = np.minimum.reduceat(dists, starts)
+    return min_dist
 
-    for i in range(len(polyline) - 1):
-        seg_start = polyline[i]
-        seg_end = polyline[i + 1]
 
-        d = haversine(point[0], point[1], seg_start[0], seg_start[1])
-        if d < min_dist:
-            min_dist = d
-            best_idx = i
-            best_cumulative = cumulative_dist
+def _as_coords(values) -> np.ndarray:
+    """A polyline coordinate column as a contiguous float64 array."""
+    return np.ascontiguousarray(values, dtype=np.float64)
 
-        cumulative_dist += haversine(seg_start[0], seg_start[1], seg_end[0], seg_end[1])
 
-    # Check last point
-    d = haversine(point[0], point[1], polyline[-1][0], polyline[-1][1])
-    if d < min_dist:
-        best_idx = len(polyline) - 2
-        best_cumulative = cumulative_dist
+def project_point_on_polyline(
+    pt_lat: float,
+    pt_lng: float,
+    poly_lat: np.ndarray,
+    poly_lng: np.ndarray,
+) -> Tuple[int, float]:
+    """Project a point onto the nearest segment of a polyline given as lat/lng arrays.
 
-    return best_idx, best_cumulative
+    Returns (segment_index, distance_from_start_m).
+    """
+    poly_lat, poly_lng = _as_coords(poly_lat), _as_coords(poly_lng)
+    vertex = _project_vertex(pt_lat, pt_lng, poly_lat, poly_lng)
+    cum = _cumulative_length(poly_lat, poly_lng)
+    return min(vertex, len(poly_lat) - 2), float(cum[vertex])
 
 
 def calculate_route_overlap(
-    driver_polyline: List[List[float]],
+    poly_lat: np.ndarray,
+    poly_lng: np.ndarray,
     rider_pickup: Tuple[float, float],
     rider_dropoff: Tuple[float, float],
 ) -> float:
-    """Calculate route overlap ratio.
+    """Calculate route overlap ratio against a driver polyline given as lat/lng arrays.
 
     Project rider pickup and dropoff onto driver polyline.
     If both project in order (same direction):
         overlap_ratio = Σₖ₌ᵢʲ dist(pₖ, pₖ₊₁) / total_length(P)
     Else: overlap_ratio = 0 (opposite direction)
     """
-    if len(driver_polyline) < 2:
-        return 0.0
-
-    pickup_idx, pickup_dist = project_point_on_polyline(rider_pickup, driver_polyline)
-    dropoff_idx, dropoff_dist = project_point_on_polyline(rider_dropoff, driver_polyline)
-
-    # Check if same direction (pickup before dropoff along route)
-    if pickup_idx >= dropoff_idx and pickup_dist >= dropoff_dist:
-        return 0.0  # Opposite direction
-
-    # Calculate total route length
-    total_length = 0.0
-    for i in range(len(driver_polyline) - 1):
-        total_length += haversine(
-            driver_polyline[i][0], driver_polyline[i][1],
-            driver_polyline[i + 1][0], driver_polyline[i + 1][1],
-        )
+    poly_lat, poly_lng = _as_coords(poly_lat), _as_coords(poly_lng)
+    return _route_overlap(
+        poly_lat, poly_lng, _cumulative_length(poly_lat, poly_lng),
+        rider_pickup[0], rider_pickup[1],
+        rider_dropoff[0], rider_dropoff[1],
+    )
 
-    if total_length <= 0:
-        return 0.0
 
-    # Calculate overlap segment length
-    overlap_length = 0.0
-    start_idx = pickup_idx
-    end_idx = min(dropoff_idx + 1, len(driver_polyline) - 1)
-    for i in range(start_idx, end_idx):
-        overlap_length += haversine(
-            driver_polyline[i][0], driver_polyline[i][1],
-            driver_polyline[i + 1][0], driver_polyline[i + 1][1],
-        )
+def _departure_ts(obj: Dict[str, Any]) -> float:
+    """departureTime of a ride or rider request as epoch seconds.
 
-    overlap_ratio = overlap_length / total_length
-    return min(overlap_ratio, 1.0)
+    ISO strings (trailing Z = UTC) and datetimes are accepted; naive times
+    are taken as UTC.
+    """
+    value = obj["departureTime"]
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
 
 
 def calculate_time_compatibility(
-    driver_departure: datetime,
-    rider_departure: datetime,
+    driver_departure_ts: float,
+    rider_departure_ts: float,
 ) -> float:
-    """Calculate time compatibility score.
+    """Calculate time compatibility score from epoch-second departure times.
 
     TimeCompat = max(0, 1 − |t_driver − t_rider| / 1800)  [1800s = 30min]
     """
-    time_diff = abs((driver_departure - rider_departure).total_seconds())
+    time_diff = abs(driver_departure_ts - rider_departure_ts)
     return max(0.0, 1.0 - time_diff / matching_config.t_max_seconds)
 
 
@@ -195,20 +319,33 @@ def calculate_preference_match(
 
 def calculate_proximity_score(
     rider_pickup: Tuple[float, float],
-    driver_polyline: List[List[float]],
-    epsilon_m: float = 2000.0,
+    poly_lat: np.ndarray,
+    poly_lng: np.ndarray,
+    epsilon_m: float = PROXIMITY_EPSILON_M,
 ) -> float:
-    """Calculate proximity score.
+    """Calculate proximity score against a driver polyline given as lat/lng arrays.
 
-    Proximity = max(0, 1 − haversine(rider_pickup, nearest_point_on_route_d) / ε)
+    Proximity = max(0, 1 − min_k ‖p − v_k‖ / ε)
+
+    with p the rider pickup and v_k the polyline vertices in the route's
+    tangent plane centred on its middle vertex (see _polyline_enu), i.e. the
+    equirectangular distance to the nearest vertex, as in match_rides
+    (see _min_distances).
     """
-    min_dist = float("inf")
-    for point in driver_polyline:
-        d = haversine(rider_pickup[0], rider_pickup[1], point[0], point[1])
-        if d < min_dist:
-            min_dist = d
+    enu = _polyline_enu(np.radians(_as_coords(poly_lat)), np.radians(_as_coords(poly_lng)))
+    min_dist = _min_distances([enu], np.radians(rider_pickup))[0]
+    return max(0.0, 1.0 - float(min_dist) / epsilon_m)
+
 
-    return max(0.0, 1.0 - min_dist / epsilon_m)
+def _score_upper_bound(time_compat, pref_match):
+    """Best score reachable given the cheap terms: RouteOverlap = Proximity = 1."""
+    cfg = matching_config
+    return (
+        cfg.w_route_overlap
+        + cfg.w_time_compat * time_compat
+        + cfg.w_pref_match * pref_match
+        + cfg.w_proximity
+    )
 
 
 def calculate_match_score(
@@ -221,72 +358,136 @@ def calculate_match_score(
     w₁=0.35, w₂=0.25, w₃=0.15, w₄=0.25
 
     Rank matches by S descending; threshold S ≥ 0.4
+
+    The cheap terms are scored first. If even RouteOverlap = Proximity = 1
+    could not reach the threshold,
+        w₁ + w₂·TimeCompat + w₃·PrefMatch + w₄ < S_min,
+    the polyline is never walked: routeOverlap and proximity are returned
+    as None (not computed) and S counts them as 0.
     """
     cfg = matching_config
 
-    driver_polyline = driver_ride.get("polyline", [])
+    poly_lat, poly_lng, cum = _prepare_ride(driver_ride)
     rider_pickup = (
         rider_request["origin"]["lat"],
         rider_request["origin"]["lng"],
     )
+    pickup_rad = (math.radians(rider_pickup[0]), math.radians(rider_pickup[1]))
     rider_dropoff = (
         rider_request["destination"]["lat"],
         rider_request["destination"]["lng"],
     )
 
-    # RouteOverlap ∈ [0,1]
-    route_overlap = calculate_route_overlap(driver_polyline, rider_pickup, rider_dropoff)
-
     # TimeCompat ∈ [0,1]
-    driver_time = datetime.fromisoformat(driver_ride["departureTime"].replace("Z", "+00:00")) if isinstance(driver_ride["departureTime"], str) else driver_ride["departureTime"]
-    rider_time = datetime.fromisoformat(rider_request["departureTime"].replace("Z", "+00:00")) if isinstance(rider_request["departureTime"], str) else rider_request["departureTime"]
-    time_compat = calculate_time_compatibility(driver_time, rider_time)
+    time_compat = calculate_time_compatibility(_departure_ts(driver_ride), _departure_ts(rider_request))
 
     # PrefMatch ∈ {0,1}
     driver_prefs = driver_ride.get("preferences", {})
     rider_prefs = rider_request.get("preferences", {})
     pref_match = calculate_preference_match(driver_prefs, rider_prefs)
 
-    # ProximityScore ∈ [0,1]
-    proximity = calculate_proximity_score(rider_pickup, driver_polyline)
+    # Geometric terms stay None (not computed) for a pruned ride
+    route_overlap = None
+    proximity = None
+    if _score_upper_bound(time_compat, pref_match) >= cfg.min_match_score:
+        # RouteOverlap ∈ [0,1]
+        route_overlap = _route_overlap(
+            poly_lat, poly_lng, cum,
+            rider_pickup[0], rider_pickup[1],
+            rider_dropoff[0], rider_dropoff[1],
+        )
+
+        # ProximityScore ∈ [0,1], nearest vertex in the ride's tangent plane
+        enu = _polyline_enu(np.radians(poly_lat), np.radians(poly_lng))
+        min_dist = _min_distances([enu], np.array(pickup_rad))[0]
+        proximity = max(0.0, 1.0 - float(min_dist) / PROXIMITY_EPSILON_M)
 
     # S(d,r) = w₁·RouteOverlap + w₂·TimeCompat + w₃·PrefMatch + w₄·Proximity
     score = (
-        cfg.w_route_overlap * route_overlap
+        cfg.w_route_overlap * (route_overlap or 0.0)
         + cfg.w_time_compat * time_compat
         + cfg.w_pref_match * pref_match
-        + cfg.w_proximity * proximity
+        + cfg.w_proximity * (proximity or 0.0)
     )
 
-    # Calculate detour
+    # Detour ≈ 0.5 × haversine(rider pickup, route start), as in match_rides
     detour_km = 0.0
-    if driver_polyline and len(driver_polyline) >= 2:
-        direct_dist = haversine_km(
-            driver_polyline[0][0], driver_polyline[0][1],
-            driver_polyline[-1][0], driver_polyline[-1][1],
-        )
-        pickup_detour = haversine_km(
-            rider_pickup[0], rider_pickup[1],
-            driver_polyline[0][0], driver_polyline[0][1],
-        )
+    if len(poly_lat) >= 2:
+        pickup_detour = haversine_rad(
+            pickup_rad[0], pickup_rad[1], math.radians(poly_lat[0]), math.radians(poly_lng[0])
+        ) / 1000.0
         detour_km = pickup_detour * 0.5  # Approximate
 
     return {
         "rideId": driver_ride.get("rideId", driver_ride.get("_id", "")),
         "score": round(score, 4),
-        "routeOverlap": round(route_overlap, 4),
+        "routeOverlap": None if route_overlap is None else round(route_overlap, 4),
         "timeCompat": round(time_compat, 4),
         "prefMatch": round(pref_match, 4),
-        "proximity": round(proximity, 4),
+        "proximity": None if proximity is None else round(proximity, 4),
         "detourKm": round(detour_km, 2),
         "detourMinutes": round(detour_km / 30 * 60, 1),  # Rough estimate at 30km/h
         "isValid": score >= cfg.min_match_score,
     }
 
 
+# Driver preference bits (see _driver_pref_bits)
+PREF_SMOKING = 1 << 0  # smokingAllowed is True
+PREF_MUSIC = 1 << 1    # plays music: musicPreference not "silent"/"no_preference"
+_GENDER_BITS: Dict[Any, int] = {
+    None: 1 << 2,
+    "male": 1 << 3,
+    "female": 1 << 4,
+    "other": 1 << 5,
+    "prefer_not_to_say": 1 << 6,
+}
+
+
+def _driver_pref_bits(ride: Dict[str, Any]) -> int:
+    """Encode a ride's preferences as PREF_* | gender bit."""
+    prefs = ride.get("preferences", {})
+    bits = _GENDER_BITS.get(prefs.get("gender"), 0)
+    if prefs.get("smokingAllowed") is True:
+        bits |= PREF_SMOKING
+    if prefs.get("musicPreference", "no_preference") not in ("silent", "no_preference"):
+        bits |= PREF_MUSIC
+    return bits
+
+
+def _preference_mask(
+    rides: List[Dict[str, Any]],
+    rider_prefs: Dict[str, Any],
+) -> np.ndarray:
+    """calculate_preference_match of one rider against every ride, as a bool array.
+
+    The rider becomes a (required, forbidden) bit pair, so the filters reduce to
+        ok = (bits & forbidden == 0) & (bits & required == required)
+    """
+    bits = np.fromiter((_driver_pref_bits(ride) for ride in rides), np.int64, len(rides))
+
+    forbidden = 0
+    if rider_prefs.get("smokingAllowed") is False:
+        forbidden |= PREF_SMOKING
+    if rider_prefs.get("musicPreference", "no_preference") == "silent":
+        forbidden |= PREF_MUSIC
+
+    required = 0
+    same_gender = bool(rider_prefs.get("sameGenderOnly"))
+    if same_gender:
+        required = _GENDER_BITS.get(rider_prefs.get("gender"), 0)
+
+    mask = ((bits & forbidden) == 0) & ((bits & required) == required)
+    if same_gender and required == 0:
+        # Gender outside the known values: compare the strings directly
+        gender = rider_prefs.get("gender")
+        mask &= np.array([ride.get("preferences", {}).get("gender") == gender for ride in rides], dtype=bool)
+    return mask
+
+
 def match_rides(
     rider_request: Dict[str, Any],
     available_rides: List[Dict[str, Any]],
+    top_k: Optional[int] = None,
 ) -> List[Dict[str, Any]]:
     """Match a rider with available rides.
 
@@ -294,16 +495,105 @@ def match_rides(
     2. Calculate match score for each ride
     3. Sort by score descending
     4. Filter by minimum score threshold (0.4)
+    5. Keep the top_k best (default matching_config.top_k; None keeps all)
+
+    Scores every ride in one batch, with the same terms as
+    calculate_match_score: all polylines are concatenated so route overlap
+    is one compiled call and proximity one vectorized distance pass reduced
+    per ride with np.minimum.reduceat. Rides whose time and preference terms
+    already rule them out (see calculate_match_score) are dropped before any
+    geometry is touched.
     """
-    matches = []
+    if not available_rides:
+        return []
+
+    cfg = matching_config
+    pickup = (rider_request["origin"]["lat"], rider_request["origin"]["lng"])
+    dropoff = (rider_request["destination"]["lat"], rider_request["destination"]["lng"])
+    pickup_rad = np.radians(pickup)
+
+    # TimeCompat = max(0, 1 − |t_driver − t_rider| / T_max)
+    driver_ts = np.fromiter((_departure_ts(ride) for ride in available_rides), np.float64, len(available_rides))
+    time_diff = np.abs(driver_ts - _departure_ts(rider_request))
+    time_compat = np.maximum(0.0, 1.0 - time_diff / cfg.t_max_seconds)
+
+    # PrefMatch ∈ {0,1}
+    pref_match = _preference_mask(available_rides, rider_request.get("preferences", {})).astype(np.float64)
+
+    candidates = np.flatnonzero(_score_upper_bound(time_compat, pref_match) >= cfg.min_match_score)
+    if len(candidates) == 0:
+        return []
+    rides = [available_rides[k] for k in candidates]
+    time_compat = time_compat[candidates]
+    pref_match = pref_match[candidates]
+
+    geoms = [_prepare_ride(ride) for ride in rides]
+    lengths = np.array([len(g[0]) for g in geoms], dtype=np.int64)
+    offsets = np.zeros(len(geoms) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    all_lat = np.concatenate([g[0] for g in geoms])
+    all_lng = np.concatenate([g[1] for g in geoms])
+    all_cum = np.concatenate([g[2] for g in geoms])
+
+    # RouteOverlap ∈ [0,1]
+    route_overlap = _route_overlaps(
+        all_lat, all_lng, all_cum, offsets,
+        pickup[0], pickup[1], dropoff[0], dropoff[1],
+    )
 
-    for ride in available_rides:
-        result = calculate_match_score(ride, rider_request)
-        if result["isValid"]:
-            matches.append(result)
+    # Proximity: nearest polyline vertex per ride (inf for an empty polyline),
+    # measured in each ride's tangent plane (see _polyline_enu)
+    enus = [_polyline_enu(np.radians(lat), np.radians(lng)) for lat, lng, _ in geoms]
+    min_dist = _min_distances(enus, pickup_rad)
+    proximity = np.maximum(0.0, 1.0 - min_dist / PROXIMITY_EPSILON_M)
 
-    # Sort by score descending
-    matches.sort(key=lambda x: x["score"], reverse=True)
+    # S(d,r) = w₁·RouteOverlap + w₂·TimeCompat + w₃·PrefMatch + w₄·Proximity
+    components = np.stack((route_overlap, time_compat, pref_match, proximity))
+    score = cfg.weights @ components
+
+    # Detour ≈ 0.5 × haversine(rider pickup, route start), for routes of ≥ 2 points
+    detour_km = np.zeros(len(geoms))
+    routed = lengths >= 2
+    if routed.any():
+        first = offsets[:-1][routed]
+        starts = np.radians(np.column_stack((all_lat[first], all_lng[first])))
+        detour_km[routed] = haversine_distances(pickup_rad[None, :], starts)[0] * EARTH_RADIUS_KM * 0.5
+
+    # Round and rank the valid rows in one pass; result dicts only for those
+    valid = np.flatnonzero(score >= cfg.min_match_score)
+    terms = np.round(np.vstack((score, components))[:, valid], 4)
+    detour_km = detour_km[valid]
+    detour_minutes = np.round(detour_km / 30 * 60, 1)  # Rough estimate at 30km/h
+    detour_km = np.round(detour_km, 2)
+
+    # Sort by score descending (equal scores keep ride order). For a top-K
+    # cut, argpartition selects the K best in O(n) and only those are sorted.
+    if top_k is None:
+        top_k = cfg.top_k
+    if top_k is not None and top_k < len(valid):
+        best = np.argpartition(-terms[0], top_k - 1)[:top_k] if top_k > 0 else np.arange(0)
+        ranked = best[np.lexsort((best, -terms[0][best]))]
+    else:
+        ranked = np.argsort(-terms[0], kind="stable")
+    terms = terms[:, ranked].tolist()
+    valid = valid[ranked].tolist()
+
+    matches = []
+    for k, s, ro, tc, pm, px, dk, dm in zip(
+        valid, *terms, detour_km[ranked].tolist(), detour_minutes[ranked].tolist(),
+    ):
+        ride = rides[k]
+        matches.append({
+            "rideId": ride.get("rideId", ride.get("_id", "")),
+            "score": s,
+            "routeOverlap": ro,
+            "timeCompat": tc,
+            "prefMatch": pm,
+            "proximity": px,
+            "detourKm": dk,
+            "detourMinutes": dm,
+            "isValid": True,
+        })
     return matches
 
 
@@ -319,26 +609,8 @@ def nearest_neighbor_tsp(
     if not waypoints:
         return []
 
-    n = len(waypoints)
-    visited = [False] * n
-    order = []
-    current = start
-
-    for _ in range(n):
-        min_dist = float("inf")
-        nearest_idx = -1
-        for i in range(n):
-            if not visited[i]:
-                d = haversine(current[0], current[1], waypoints[i][0], waypoints[i][1])
-                if d < min_dist:
-                    min_dist = d
-                    nearest_idx = i
-        if nearest_idx >= 0:
-            visited[nearest_idx] = True
-            order.append(nearest_idx)
-            current = waypoints[nearest_idx]
-
-    return order
+    D = equirect_distance_matrix([start, *waypoints, end])
+    return _nn_tsp(D).tolist()
 
 
 def two_opt_improve(
@@ -348,38 +620,11 @@ def two_opt_improve(
     end: Tuple[float, float],
 ) -> List[int]:
     """Improve waypoint ordering using 2-opt local search."""
-    improved = True
-    best_order = list(order)
-
-    def total_distance(ord_list: List[int]) -> float:
-        d = haversine(start[0], start[1], waypoints[ord_list[0]][0], waypoints[ord_list[0]][1])
-        for i in range(len(ord_list) - 1):
-            d += haversine(
-                waypoints[ord_list[i]][0], waypoints[ord_list[i]][1],
-                waypoints[ord_list[i + 1]][0], waypoints[ord_list[i + 1]][1],
-            )
-        d += haversine(
-            waypoints[ord_list[-1]][0], waypoints[ord_list[-1]][1],
-            end[0], end[1],
-        )
-        return d
-
-    best_dist = total_distance(best_order)
-
-    max_iter = 100
-    while improved and max_iter > 0:
-        max_iter -= 1
-        improved = False
-        for i in range(len(best_order) - 1):
-            for j in range(i + 1, len(best_order)):
-                new_order = best_order[:i] + best_order[i:j + 1][::-1] + best_order[j + 1:]
-                new_dist = total_distance(new_order)
-                if new_dist < best_dist:
-                    best_order = new_order
-                    best_dist = new_dist
-                    improved = True
-
-    return best_order
+    if len(order) < 2:
+        return list(order)
+    D = equirect_distance_matrix([start, *waypoints, end])
+    best_order = _two_opt(np.asarray(order, dtype=np.int64), D, 100)
+    return best_order.tolist()
 
 
 def optimize_waypoint_order(
@@ -394,10 +639,42 @@ def optimize_waypoint_order(
     if len(waypoints) <= 1:
         return list(range(len(waypoints)))
 
+    # One distance matrix over [origin, waypoints..., destination] for both passes
+    D = equirect_distance_matrix([origin, *waypoints, destination])
+
     # Initial order via nearest-neighbor
-    order = nearest_neighbor_tsp(origin, waypoints, destination)
+    order = _nn_tsp(D)
 
     # Improve with 2-opt
-    order = two_opt_improve(waypoints, order, origin, destination)
+    order = _two_opt(order, D, 100)
+
+    return order.tolist()
+
+
+def warmup() -> None:
+    """Compile, or load from Numba's on-disk cache, every matching kernel.
+
+    Scores one tiny ride and orders three waypoints, like
+    algorithms.astar.warmup does for routing.
+    """
+    ride = {
+        "rideId": "warmup",
+        "polyline": [[0.0, 0.0], [0.0, 0.01], [0.0, 0.02]],
+        "departureTime": "2024-01-01T08:00:00Z",
+    }
+    rider = {
+        "origin": {"lat": 0.0, "lng": 0.001},
+        "destination": {"lat": 0.0, "lng": 0.019},
+        "departureTime": "2024-01-01T08:00:00Z",
+    }
+    match_rides(rider, [ride])
+    calculate_match_score(ride, rider)
+
+    lat, lng = _polyline_arrays(ride["polyline"])
+    project_point_on_polyline(0.0, 0.001, lat, lng)
+    calculate_route_overlap(lat, lng, (0.0, 0.001), (0.0, 0.019))
+    calculate_proximity_score((0.0, 0.001), lat, lng)
 
-    return order
+    waypoints = [(0.0, 0.015), (0.0, 0.005), (0.0, 0.01)]
+    optimize_waypoint_order((0.0, 0.0), (0.0, 0.02), waypoints)
+    haversine_distance_matrix(waypoints)
@@ -0,0 +1,198 @@
+"""
+Numba-compiled geometry kernels for carpool matching.
+
+Polylines and waypoint sets are passed as flat lat/lng float arrays so the
+distance loops behind route overlap and waypoint ordering run as native
+code. Every kernel reproduces the rule of the algorithms/matching.py
+function that calls it.
+
+Segment lengths (and so overlap ratios) use haversine. The nearest-vertex
+searches are local, so they use the equirectangular distance with the
+reference latitude at the polyline's middle vertex. Waypoint ordering runs
+on a precomputed distance matrix.
+
+    _cumulative_length cum[k] = Σᵢ₌₀ᵏ⁻¹ dist(pᵢ, pᵢ₊₁)  (computed once per polyline)
+    _project_vertex    nearest polyline vertex to a point
+    _project_two       _project_vertex for two points in one pass
+    _route_overlap     overlap = (cum[j] − cum[i]) / cum[P−1]
+    _route_overlaps    _route_overlap for many polylines concatenated end to end
+    _nn_tsp            nearest-neighbor waypoint order from start on a distance matrix
+    _two_opt           2-opt improvement of a waypoint order on a distance matrix
+"""
+
+import math
+
+import numpy as np
+from numba import njit
+
+from utils.haversine_numba import haversine_nb, equirect_nb
+
+
+@njit(cache=True)
+def _cumulative_length(poly_lat, poly_lng):
+    """cum[k] = length in meters of the polyline from vertex 0 to vertex k."""
+    n = len(poly_lat)
+    cum = np.zeros(n)
+    for i in range(n - 1):
+        cum[i + 1] = cum[i] + haversine_nb(poly_lat[i], poly_lng[i], poly_lat[i + 1], poly_lng[i + 1])
+    return cum
+
+
+@njit(cache=True)
+def _ref_cos(poly_lat):
+    """cos(φ) at the polyline's middle vertex, the equirectangular reference."""
+    return math.cos(math.radians(poly_lat[len(poly_lat) // 2]))
+
+
+@njit(cache=True)
+def _project_vertex(lat, lng, poly_lat, poly_lng):
+    """Index of the polyline vertex nearest to a point.
+
+    Vertices 0..n-2 are scanned first and the last vertex only wins if it is
+    strictly nearer, matching matching.project_point_on_polyline.
+    """
+    n = len(poly_lat)
+    cos_ref = _ref_cos(poly_lat)
+    min_dist = np.inf
+    best = 0
+    for i in range(n - 1):
+        d = equirect_nb(lat, lng, poly_lat[i], poly_lng[i], cos_ref)
+        if d < min_dist:
+            min_dist = d
+            best = i
+    if equirect_nb(lat, lng, poly_lat[n - 1], poly_lng[n - 1], cos_ref) < min_dist:
+        best = n - 1
+    return best
+
+
+@njit(cache=True)
+def _project_two(lat1, lng1, lat2, lng2, poly_lat, poly_lng):
+    """(_project_vertex of point 1, _project_vertex of point 2) in a single polyline pass."""
+    n = len(poly_lat)
+    cos_ref = _ref_cos(poly_lat)
+    min1 = np.inf
+    min2 = np.inf
+    best1 = 0
+    best2 = 0
+    for i in range(n - 1):
+        plat = poly_lat[i]
+        plng = poly_lng[i]
+        d1 = equirect_nb(lat1, lng1, plat, plng, cos_ref)
+        d2 = equirect_nb(lat2, lng2, plat, plng, cos_ref)
+        if d1 < min1:
+            min1 = d1
+            best1 = i
+        if d2 < min2:
+            min2 = d2
+            best2 = i
+    plat = poly_lat[n - 1]
+    plng = poly_lng[n - 1]
+    if equirect_nb(lat1, lng1, plat, plng, cos_ref) < min1:
+        best1 = n - 1
+    if equirect_nb(lat2, lng2, plat, plng, cos_ref) < min2:
+        best2 = n - 1
+    return best1, best2
+
+
+@njit(cache=True)
+def _route_overlap(poly_lat, poly_lng, cum, pickup_lat, pickup_lng, dropoff_lat, dropoff_lng):
+    """Route overlap ratio of a rider's pickup → dropoff along the polyline (0 if reversed).
+
+    cum is the polyline's _cumulative_length array.
+    """
+    n = len(poly_lat)
+    if n < 2:
+        return 0.0
+
+    pickup_v, dropoff_v = _project_two(pickup_lat, pickup_lng, dropoff_lat, dropoff_lng, poly_lat, poly_lng)
+    # Segment index of each projection (the last vertex maps to the last segment)
+    pickup_idx = min(pickup_v, n - 2)
+    dropoff_idx = min(dropoff_v, n - 2)
+
+    # Opposite direction: pickup not before dropoff along the route
+    if pickup_idx >= dropoff_idx and cum[pickup_v] >= cum[dropoff_v]:
+        return 0.0
+
+    total_length = cum[n - 1]
+    if total_length <= 0:
+        return 0.0
+
+    overlap_length = cum[min(dropoff_idx + 1, n - 1)] - cum[pickup_idx]
+    return min(overlap_length / total_length, 1.0)
+
+
+@njit(cache=True)
+def _route_overlaps(lat, lng, cum, offsets, pickup_lat, pickup_lng, dropoff_lat, dropoff_lng):
+    """_route_overlap of one rider against every polyline in a concatenated batch.
+
+    Polyline k occupies lat/lng/cum[offsets[k]:offsets[k + 1]].
+    """
+    n = len(offsets) - 1
+    out = np.empty(n)
+    for k in range(n):
+        a = offsets[k]
+        b = offsets[k + 1]
+        out[k] = _route_overlap(
+            lat[a:b], lng[a:b], cum[a:b],
+            pickup_lat, pickup_lng, dropoff_lat, dropoff_lng,
+        )
+    return out
+
+
+@njit(cache=True)
+def _nn_tsp(D):
+    """Nearest-neighbor ordering of waypoints, on the (n+2)×(n+2) matrix of _two_opt.
+
+    Starts at row 0 (start) and repeatedly moves to the nearest unvisited
+    waypoint (rows 1..n); returns waypoint indices 0..n-1.
+    """
+    n = D.shape[0] - 2
+    visited = np.zeros(n + 1, dtype=np.uint8)
+    order = np.empty(n, dtype=np.int64)
+    cur = 0
+    for k in range(n):
+        min_dist = np.inf
+        nearest = 1
+        for i in range(1, n + 1):
+            if not visited[i] and D[cur, i] < min_dist:
+                min_dist = D[cur, i]
+                nearest = i
+        visited[nearest] = 1
+        order[k] = nearest - 1
+        cur = nearest
+    return order
+
+
+@njit(cache=True, fastmath=True)
+def _two_opt(order, D, max_iter):
+    """2-opt local search: reverse order[i..j] whenever it shortens the tour.
+
+    D is the (n+2)×(n+2) distance matrix over [start, waypoints..., end].
+    Each reversal is scored by its change in length,
+        Δ = D[a, c] + D[b, d] − D[a, b] − D[c, d]
+    where a→b and c→d are the two edges it replaces, so a candidate costs
+    O(1) instead of a full tour sum.
+    """
+    n = len(order)
+    # tour = [start, waypoints in order..., end] as rows of D
+    tour = np.empty(n + 2, dtype=np.int64)
+    tour[0] = 0
+    tour[1:n + 1] = order + 1
+    tour[n + 1] = n + 1
+
+    improved = True
+    while improved and max_iter > 0:
+        max_iter -= 1
+        improved = False
+        for i in range(1, n):
+            for j in range(i + 1, n + 1):
+                a = tour[i - 1]
+                b = tour[i]
+                c = tour[j]
+                d = tour[j + 1]
+                delta = D[a, c] + D[b, d] - D[a, b] - D[c, d]
+                if delta < -1e-9:
+                    tour[i:j + 1] = tour[i:j + 1][::-1].copy()
+                    improved = True
+
+    return tour[1:n + 1] - 1
@@ -1,10 +1,54 @@
 """AUMO v2 AI Service Configuration."""
+import hashlib
+import hmac
 import os
+import sys
 from dataclasses import dataclass, field
-from typing import Tuple
+from types import SimpleNamespace
+from typing import NamedTuple, Optional, Tuple
 
+import numpy as np
 
-@dataclass
+
+def _parse_bbox(s: str) -> Tuple[float, float, float, float]:
+    """Parse "south,west,north,east" into a 4-tuple of floats.
+
+    Raises ValueError naming the whole string if it is not exactly four
+    comma-separated numbers, so a bad OSM_BBOX fails once at import.
+    """
+    a, _, rest = s.partition(",")
+    b, _, rest = rest.partition(",")
+    c, _, d = rest.partition(",")
+    try:
+        return (float(a), float(b), float(c), float(d))
+    except ValueError as e:
+        raise ValueError(
+            f"OSM_BBOX must be 4 comma-separated floats (south,west,north,east), got {s!r}"
+        ) from e
+
+
+# Environment variables with defaults for local and production
+# OSRM URL: Use public server for production, localhost for development
+# Public OSRM: https://router.project-osrm.org (free, rate-limited)
+# Local OSRM: http://localhost:5001 (requires Docker setup)
+# String values are interned so equal strings elsewhere share one object
+def _load_env() -> SimpleNamespace:
+    """Read and parse the environment; called once, at import, to build _ENV."""
+    return SimpleNamespace(
+        osrm_url=sys.intern(os.getenv("OSRM_URL", "https://router.project-osrm.org")),
+        model_path=sys.intern(os.getenv("MODEL_PATH", "saved_models/traffic_lstm.pt")),
+        api_key=sys.intern(os.getenv("API_KEY", "aumo-ai-api-key-change-in-production")),
+        osm_bbox=_parse_bbox(os.getenv("OSM_BBOX", "18.40,73.70,18.65,73.95")),
+        quantize_model=os.getenv("QUANTIZE_MODEL", "0") == "1",
+    )
+
+
+_ENV = _load_env()
+
+_OSM_BBOX_DEFAULT: Tuple[float, float, float, float] = _ENV.osm_bbox
+
+
+@dataclass(frozen=True, slots=True)
 class ModelConfig:
     input_dim: int = 10
     hidden_dim_1: int = 128
@@ -22,25 +66,29 @@ class ModelConfig:
     early_stop_patience: int = 10
     l2_lambda: float = 0.01
     temporal_lambda: float = 0.001
+    window: int = field(init=False)  # lookback + forecast, one training sample
+
+    def __post_init__(self):
+        object.__setattr__(self, "window", self.lookback + self.forecast)
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class GraphConfig:
-    osm_bbox: Tuple[float, float, float, float] = field(default_factory=lambda: (
-        float(os.getenv("OSM_BBOX", "18.40,73.70,18.65,73.95").split(",")[0]),
-        float(os.getenv("OSM_BBOX", "18.40,73.70,18.65,73.95").split(",")[1]),
-        float(os.getenv("OSM_BBOX", "18.40,73.70,18.65,73.95").split(",")[2]),
-        float(os.getenv("OSM_BBOX", "18.40,73.70,18.65,73.95").split(",")[3]),
-    ))
+    osm_bbox: Tuple[float, float, float, float] = _OSM_BBOX_DEFAULT
     v_max_kmh: float = 120.0
     bpr_alpha: float = 0.15
     bpr_beta: float = 4.0
+    v_max_ms: float = field(init=False)  # v_max_kmh in m/s, for the A* heuristic
 
+    def __post_init__(self):
+        object.__setattr__(self, "v_max_ms", self.v_max_kmh / 3.6)
 
-@dataclass
+
+@dataclass(frozen=True, slots=True)
 class MatchingConfig:
     dbscan_eps_km: float = 2.0
     dbscan_min_pts: int = 2
+    dbscan_subsample_threshold: int = 2000  # above this many pickups, cluster with DBSCAN++
     max_detour_ratio: float = 0.3
     min_match_score: float = 0.4
     w_route_overlap: float = 0.35
@@ -48,24 +96,43 @@ class MatchingConfig:
     w_pref_match: float = 0.15
     w_proximity: float = 0.25
     t_max_seconds: float = 1800.0
-
-
-@dataclass
-class RoutingConfig:
+    top_k: Optional[int] = None  # keep only the K best matches (None = all)
+    # [w_route_overlap, w_time_compat, w_pref_match, w_proximity] for batched scoring
+    weights: np.ndarray = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        weights = np.array(
+            [self.w_route_overlap, self.w_time_compat, self.w_pref_match, self.w_proximity],
+            dtype=np.float64,
+        )
+        if abs(weights.sum() - 1.0) > 1e-6:
+            raise ValueError(f"MatchingConfig weights must sum to 1, got {weights.sum():.6f}")
+        weights.flags.writeable = False
+        object.__setattr__(self, "weights", weights)
+
+
+class RoutingConfig(NamedTuple):
     default_alpha: float = 0.5
     default_beta: float = 0.35
     default_gamma: float = 0.15
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class EmissionConfig:
     fuel_a: float = 0.0667
     fuel_b: float = 0.0556
     fuel_c: float = 0.000472
     co2_per_liter: float = 2310.0
+    # v·fc(v) = fuel_c·v³ + fuel_a·v + fuel_b as np.polyval coefficients (highest power first)
+    fuel_poly: np.ndarray = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        fuel_poly = np.array([self.fuel_c, 0.0, self.fuel_a, self.fuel_b], dtype=np.float64)
+        fuel_poly.flags.writeable = False
+        object.__setattr__(self, "fuel_poly", fuel_poly)
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class SyntheticDataConfig:
     num_days: int = 90
     num_segments: int = 50
@@ -77,15 +144,39 @@ class SyntheticDataConfig:
     incident_speed_factor: float = 0.5
     rain_speed_reduction: float = 0.15
     snow_speed_reduction: float = 0.30
+    # bool[24] by integer hour: mask[h] ⇔ start <= h < end of the peak window
+    peak_morning_mask: np.ndarray = field(init=False, repr=False, compare=False)
+    peak_evening_mask: np.ndarray = field(init=False, repr=False, compare=False)
 
+    def __post_init__(self):
+        for name, (start, end) in (
+            ("peak_morning_mask", self.peak_morning),
+            ("peak_evening_mask", self.peak_evening),
+        ):
+            mask = np.zeros(24, dtype=np.bool_)
+            mask[start:end] = True
+            mask.flags.writeable = False
+            object.__setattr__(self, name, mask)
+
+
+OSRM_URL = _ENV.osrm_url
+MODEL_PATH = _ENV.model_path
+API_KEY = _ENV.api_key
+# Serve the LSTM with INT8 dynamic quantization on CPU (QUANTIZE_MODEL=1)
+QUANTIZE_MODEL = _ENV.quantize_model
+_API_KEY_DIGEST = hashlib.sha256(API_KEY.encode()).digest()
+
+
+def check_api_key(presented: Optional[str]) -> bool:
+    """Constant-time check of a presented API key against API_KEY.
+
+    Both sides are reduced to SHA-256 digests first, so the comparison runs
+    over 32 bytes regardless of key length.
+    """
+    if presented is None:
+        return False
+    return hmac.compare_digest(_API_KEY_DIGEST, hashlib.sha256(presented.encode()).digest())
 
-# Environment variables with defaults for local and production
-# OSRM URL: Use public server for production, localhost for development
-# Public OSRM: https://router.project-osrm.org (free, rate-limited)
-# Local OSRM: http://localhost:5001 (requires Docker setup)
-OSRM_URL = os.getenv("OSRM_URL", "https://router.project-osrm.org")
-MODEL_PATH = os.getenv("MODEL_PATH", "saved_models/traffic_lstm.pt")
-API_KEY = os.getenv("API_KEY", "aumo-ai-api-key-change-in-production")
 
 # Hugging Face Spaces specific
 HF_SPACE = os.getenv("SPACE_ID", None)  # Set by HF Spaces automatically
@@ -98,9 +189,41 @@ CORS_ORIGINS = os.getenv("CORS_ORIGINS", "http://localhost:3000,http://localhost
 # Backend URL for callbacks (if needed)
 BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:5000")
 
-model_config = ModelConfig()
-graph_config = GraphConfig()
-matching_config = MatchingConfig()
-routing_config = RoutingConfig()
-emission_config = EmissionConfig()
-synthetic_config = SyntheticDataConfig()
+
+class Config(NamedTuple):
+    """All config singletons in one object (config.CONFIG), e.g. CONFIG.graph.v_max_ms."""
+    model: ModelConfig
+    graph: GraphConfig
+    matching: MatchingConfig
+    routing: RoutingConfig
+    emission: EmissionConfig
+    synthetic: SyntheticDataConfig
+
+
+# Config singletons, built on first access (PEP 562) and then stored as
+# module globals so later lookups never reach __getattr__. CONFIG holds the
+# same instances as the *_config globals.
+_CONFIG_TYPES = {
+    "model_config": ModelConfig,
+    "graph_config": GraphConfig,
+    "matching_config": MatchingConfig,
+    "routing_config": RoutingConfig,
+    "emission_config": EmissionConfig,
+    "synthetic_config": SyntheticDataConfig,
+}
+
+
+def _singleton(name: str):
+    value = globals().get(name)
+    if value is None:
+        value = globals()[name] = _CONFIG_TYPES[name]()
+    return value
+
+
+def __getattr__(name: str):
+    if name in _CONFIG_TYPES:
+        return _singleton(name)
+    if name == "CONFIG":
+        value = globals()[name] = Config(*map(_singleton, _CONFIG_TYPES))
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
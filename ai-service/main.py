@@ -21,20 +21,20 @@ import asyncio
 import numpy as np
 import torch
 from datetime import datetime
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, HTTPException, Header, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 
-from config import MODEL_PATH, API_KEY, model_config, routing_config
+from config import MODEL_PATH, QUANTIZE_MODEL, check_api_key, model_config, routing_config
 from models.lstm_model import TrafficLSTM
 from models.trainer import train_model, load_model
 from models.data_generator import generate_sinusoidal_time_features
-from algorithms.astar import astar_route, get_traffic_overlay
+from algorithms.astar import astar_route, get_traffic_overlay, warmup as warmup_routing
 from algorithms.graph_builder import build_graph, find_nearest_node, build_synthetic_graph
-from algorithms.matching import match_rides, dbscan_cluster_pickups
+from algorithms.matching import match_rides, dbscan_cluster_pickups, warmup as warmup_matching
 from algorithms.emissions import (
     calculate_ride_emissions,
     calculate_carpool_savings,
@@ -46,8 +46,37 @@ from utils.osrm_client import get_route as osrm_get_route, decode_osrm_geometry
 # Global state
 model: Optional[TrafficLSTM] = None
 scaler: Optional[dict] = None
+# (x_min, x_range, y_min, y_range) of scaler as arrays, zero ranges set to 1
+scaler_arrays: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = None
 road_graph = None
 model_metrics: dict = {}
+# /api/predict-traffic results by (hour, minute, weekday); cleared on retrain
+_prediction_cache: Dict[tuple, Dict[str, float]] = {}
+
+
+def _scaler_arrays(s: Optional[dict]) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+    """Min-max scaler lists as (x_min, x_range, y_min, y_range) arrays, built once per model."""
+    if not s:
+        return None
+    x_min = np.array(s["x_min"])
+    x_range = np.array(s["x_max"]) - x_min
+    x_range[x_range == 0] = 1.0
+    y_min = np.array(s["y_min"])
+    y_range = np.array(s["y_max"]) - y_min
+    y_range[y_range == 0] = 1.0
+    return x_min, x_range, y_min, y_range
+
+
+def _serving_model(m: TrafficLSTM) -> torch.nn.Module:
+    """Model used for inference: INT8 dynamically quantized when QUANTIZE_MODEL
+    is set and the model runs on CPU (weights stored as int8, activations
+    quantized per call), otherwise the FP32 model unchanged."""
+    if not QUANTIZE_MODEL or next(m.parameters()).device.type != "cpu":
+        return m
+    print("[Startup] Quantizing LSTM to INT8 (dynamic)")
+    return torch.ao.quantization.quantize_dynamic(
+        m, {torch.nn.Linear, torch.nn.LSTM}, dtype=torch.qint8
+    )
 
 
 @asynccontextmanager
@@ -61,24 +90,28 @@ async def lifespan(app: FastAPI):
 
     # 1. Load or train model in background to avoid blocking startup
     async def init_model():
-        global model, scaler, model_metrics
+        global model, scaler, scaler_arrays, model_metrics
         try:
             if os.path.exists(MODEL_PATH):
                 print(f"[Startup] Loading existing model from {MODEL_PATH}")
                 try:
-                    model, scaler = load_model(MODEL_PATH)
+                    m, scaler = load_model(MODEL_PATH)
+                    scaler_arrays = _scaler_arrays(scaler)
+                    model = _serving_model(m)
                     model_metrics = {"status": "loaded", "path": MODEL_PATH}
                 except Exception as e:
                     print(f"[Startup] Failed to load model: {e}, retraining...")
                     m, metrics = await asyncio.to_thread(train_model)
-                    model = m
+                    model = _serving_model(m)
                     scaler = metrics["scaler"]
+                    scaler_arrays = _scaler_arrays(scaler)
                     model_metrics = metrics
             else:
                 print("[Startup] No saved model found, training from scratch...")
                 m, metrics = await asyncio.to_thread(train_model)
-                model = m
+                model = _serving_model(m)
                 scaler = metrics["scaler"]
+                scaler_arrays = _scaler_arrays(scaler)
                 model_metrics = metrics
             print(f"[Startup] Model ready. Metrics: {model_metrics}")
         except Exception as e:
@@ -102,6 +135,18 @@ async def lifespan(app: FastAPI):
         road_graph = build_synthetic_graph(graph_config.osm_bbox)
 
     print(f"[Startup] Road graph ready: {road_graph.number_of_nodes()} nodes, {road_graph.number_of_edges()} edges")
+
+    # 3. Load the compiled routing and matching kernels so the first request skips JIT
+    try:
+        await asyncio.to_thread(warmup_routing)
+        print("[Startup] Routing kernels compiled")
+    except Exception as e:
+        print(f"[Startup] Routing kernel warmup failed: {e}")
+    try:
+        await asyncio.to_thread(warmup_matching)
+        print("[Startup] Matching kernels compiled")
+    except Exception as e:
+        print(f"[Startup] Matching kernel warmup failed: {e}")
     print("=" * 60)
     print("AI Service ready ✓")
     print("=" * 60)
@@ -238,7 +283,7 @@ class EmissionResponse(BaseModel):
 
 async def verify_api_key(x_api_key: Optional[str] = Header(None)):
     """Verify API key for admin endpoints."""
-    if x_api_key != API_KEY:
+    if not check_api_key(x_api_key):
         raise HTTPException(status_code=401, detail="Invalid API key")
 
 
@@ -256,6 +301,83 @@ async def health_check():
     }
 
 
+def _predict_conditions(hour: float, day_of_week: int) -> Dict[str, float]:
+    """One LSTM forward pass for the traffic conditions at a time of day.
+
+    The input sequence depends only on the time, not on the segment, so the
+    result applies to every segment requested for that time. Returns the
+    rounded {speed, flow, congestion, confidence} of a prediction entry.
+    """
+    # A quantized model has no float parameters left and always runs on CPU
+    param = next(model.parameters(), None)
+    device = param.device if param is not None else torch.device("cpu")
+
+    # Use current conditions as the last timestep and extrapolate backward:
+    # timestep k is (lookback − 1 − k) × 5 min before the requested time
+    lookback = model_config.lookback
+    t_hours = (hour - (lookback - 1 - np.arange(lookback)) * 5 / 60.0) % 24.0
+    h_sin, h_cos, d_sin, d_cos = generate_sinusoidal_time_features(t_hours, day_of_week)
+
+    # Estimate base traffic for each timestep: peak, midday, night, else default
+    periods = [
+        ((t_hours >= 7) & (t_hours < 9)) | ((t_hours >= 17) & (t_hours < 19)),
+        (t_hours >= 9) & (t_hours < 17),
+        (t_hours < 5) | (t_hours >= 22),
+    ]
+    base_flow = np.select(periods, [75.0, 50.0, 15.0], default=40.0)
+    base_speed = np.select(periods, [25.0, 35.0, 55.0], default=45.0)
+    density = base_flow / np.maximum(base_speed, 1.0)
+
+    # xₜ = [flow, speed, density, hour_sin, hour_cos, day_sin, day_cos, is_holiday, weather_code, precipitation]
+    # (is_holiday = 0, weather_code = 0 (clear), precipitation = 0)
+    feature_seq = np.zeros((lookback, 10))
+    feature_seq[:, 0] = base_flow
+    feature_seq[:, 1] = base_speed
+    feature_seq[:, 2] = density
+    feature_seq[:, 3] = h_sin
+    feature_seq[:, 4] = h_cos
+    feature_seq[:, 5] = d_sin
+    feature_seq[:, 6] = d_cos
+
+    # Normalize using scaler
+    input_arr = feature_seq[None].astype(np.float32)
+    if scaler_arrays is not None:
+        x_min, x_range, y_min, y_range = scaler_arrays
+        input_arr = (input_arr - x_min) / x_range
+
+    input_tensor = torch.from_numpy(np.ascontiguousarray(input_arr, dtype=np.float32)).to(device)
+
+    # On CUDA the matmuls run in FP16 under autocast; outputs go back to FP32
+    with torch.inference_mode(), torch.autocast(
+        device.type, dtype=torch.float16, enabled=device.type == "cuda"
+    ):
+        pred, attn = model(input_tensor)
+
+    pred_np = pred.float().cpu().numpy()[0]  # (forecast_steps, 3)
+
+    # Denormalize predictions
+    if scaler_arrays is not None:
+        pred_np = pred_np * y_range + y_min
+
+    # Use first forecast step
+    pred_speed = float(max(5.0, pred_np[0][0]))
+    pred_flow = float(max(0.0, pred_np[0][1]))
+    pred_congestion = float(np.clip(pred_np[0][2], 0.0, 1.0))
+
+    # Confidence based on attention weights entropy
+    attn_np = attn.float().cpu().numpy()[0]
+    entropy = -np.sum(attn_np * np.log(attn_np + 1e-8))
+    max_entropy = np.log(len(attn_np))
+    confidence = float(1.0 - entropy / max_entropy) if max_entropy > 0 else 0.5
+
+    return {
+        "speed": round(pred_speed, 2),
+        "flow": round(pred_flow, 2),
+        "congestion": round(pred_congestion, 4),
+        "confidence": round(confidence, 4),
+    }
+
+
 @app.post("/api/predict-traffic", response_model=PredictTrafficResponse)
 async def predict_traffic(request: PredictTrafficRequest):
     """Run LSTM model inference for traffic prediction.
@@ -271,89 +393,18 @@ async def predict_traffic(request: PredictTrafficRequest):
     except (ValueError, AttributeError):
         ts = datetime.now()
 
-    hour = ts.hour + ts.minute / 60.0
-    day_of_week = ts.weekday()
-    hour_sin, hour_cos, day_sin, day_cos = generate_sinusoidal_time_features(hour, day_of_week)
-
-    predictions = []
-    device = next(model.parameters()).device
-
-    for seg in request.segments:
-        # Create a synthetic input sequence for the segment
-        # Use current conditions as the last timestep and extrapolate backward
-        feature_seq = []
-        for step in range(model_config.lookback):
-            t_offset = (model_config.lookback - 1 - step) * 5 / 60.0  # hours back
-            t_hour = (hour - t_offset) % 24.0
-            h_sin, h_cos, d_sin, d_cos = generate_sinusoidal_time_features(t_hour, day_of_week)
-
-            # Estimate base traffic for this time
-            base_flow = 40.0
-            base_speed = 45.0
-            if 7 <= t_hour < 9 or 17 <= t_hour < 19:
-                base_flow = 75.0
-                base_speed = 25.0
-            elif 9 <= t_hour < 17:
-                base_flow = 50.0
-                base_speed = 35.0
-            elif t_hour < 5 or t_hour >= 22:
-                base_flow = 15.0
-                base_speed = 55.0
-
-            density = base_flow / max(base_speed, 1.0)
-
-            # xₜ = [flow, speed, density, hour_sin, hour_cos, day_sin, day_cos, is_holiday, weather_code, precipitation]
-            feature = [
-                base_flow, base_speed, density,
-                h_sin, h_cos, d_sin, d_cos,
-                0.0,  # is_holiday
-                0.0,  # weather_code (clear)
-                0.0,  # precipitation
-            ]
-            feature_seq.append(feature)
-
-        # Normalize using scaler
-        input_arr = np.array([feature_seq], dtype=np.float32)
-        if scaler:
-            x_min = np.array(scaler["x_min"])
-            x_max = np.array(scaler["x_max"])
-            x_range = x_max - x_min
-            x_range[x_range == 0] = 1.0
-            input_arr = (input_arr - x_min) / x_range
-
-        input_tensor = torch.FloatTensor(input_arr).to(device)
-
-        with torch.no_grad():
-            pred, attn = model(input_tensor)
-
-        pred_np = pred.cpu().numpy()[0]  # (forecast_steps, 3)
-
-        # Denormalize predictions
-        if scaler:
-            y_min = np.array(scaler["y_min"])
-            y_max = np.array(scaler["y_max"])
-            y_range = y_max - y_min
-            y_range[y_range == 0] = 1.0
-            pred_np = pred_np * y_range + y_min
-
-        # Use first forecast step
-        pred_speed = float(max(5.0, pred_np[0][0]))
-        pred_flow = float(max(0.0, pred_np[0][1]))
-        pred_congestion = float(np.clip(pred_np[0][2], 0.0, 1.0))
-
-        # Confidence based on attention weights entropy
-        attn_np = attn.cpu().numpy()[0]
-        entropy = -np.sum(attn_np * np.log(attn_np + 1e-8))
-        max_entropy = np.log(len(attn_np))
-        confidence = float(1.0 - entropy / max_entropy) if max_entropy > 0 else 0.5
-
-        predictions.append({
-            "segmentId": seg.segmentId,
-            "speed": round(pred_speed, 2),
-            "flow": round(pred_flow, 2),
-            "congestion": round(pred_congestion, 4),
-            "confidence": round(confidence, 4),
-        })
+    if not request.segments:
+        return PredictTrafficResponse(predictions=[])
+
+    # Inputs only resolve to the minute, so predictions are cached per
+    # (hour, minute, weekday) until the model is retrained
+    key = (ts.hour, ts.minute, ts.weekday())
+    conditions = _prediction_cache.get(key)
+    if conditions is None:
+        conditions = _predict_conditions(ts.hour + ts.minute / 60.0, ts.weekday())
+        _prediction_cache[key] = conditions
+
+    predictions = [{"segmentId": seg.segmentId, **conditions} for seg in request.segments]
 
     return PredictTrafficResponse(predictions=predictions)
 
@@ -367,8 +418,6 @@ async def calculate_route(request: RouteRequest):
     2. A* on the OSM graph provides traffic-aware metrics & eco scoring
     3. If both fail, return an error — NEVER return a straight line
     """
-    global road_graph
-
     try:
         departure = datetime.fromisoformat(request.departureTime.replace("Z", "+00:00"))
     except (ValueError, AttributeError):
@@ -378,13 +427,47 @@ async def calculate_route(request: RouteRequest):
     alternative = None
     traffic_overlay = []
 
-    # ── Step 1: Get OSRM road-following route (primary) ──────
-    try:
-        osrm_result = await osrm_get_route(
+    def astar_eco_route():
+        """A* on the road graph plus its traffic overlay, or (None, []).
+
+        CPU-bound, so it runs in a worker thread while OSRM is awaited.
+        """
+        graph = road_graph
+        if graph is None or graph.number_of_nodes() == 0:
+            return None, []
+        start_node = find_nearest_node(graph, request.origin.lat, request.origin.lng)
+        goal_node = find_nearest_node(graph, request.destination.lat, request.destination.lng)
+        if start_node is None or goal_node is None:
+            return None, []
+        result = astar_route(
+            graph,
+            start_node,
+            goal_node,
+            departure,
+            alpha=request.weights.alpha,
+            beta=request.weights.beta,
+            gamma=request.weights.gamma,
+        )
+        if not result:
+            return None, []
+        # Build traffic overlay for the map
+        return result, get_traffic_overlay(graph, result["path_nodes"], None, departure)
+
+    # OSRM (network) and A* (local compute) run concurrently
+    osrm_result, astar_outcome = await asyncio.gather(
+        osrm_get_route(
             (request.origin.lat, request.origin.lng),
             (request.destination.lat, request.destination.lng),
             alternatives=True,
-        )
+        ),
+        asyncio.to_thread(astar_eco_route),
+        return_exceptions=True,
+    )
+
+    # ── Step 1: OSRM road-following route (primary) ──────────
+    try:
+        if isinstance(osrm_result, BaseException):
+            raise osrm_result
         if osrm_result.get("routes"):
             route = osrm_result["routes"][0]
             polyline = decode_osrm_geometry(route["geometry"])
@@ -428,52 +511,37 @@ async def calculate_route(request: RouteRequest):
     except Exception as e:
         print(f"[Route] OSRM error: {e}")
 
-    # ── Step 2: Try A* for traffic-aware eco alternative ─────
-    if road_graph is not None and road_graph.number_of_nodes() > 0:
-        try:
-            start_node = find_nearest_node(road_graph, request.origin.lat, request.origin.lng)
-            goal_node = find_nearest_node(road_graph, request.destination.lat, request.destination.lng)
-
-            if start_node is not None and goal_node is not None:
-                astar_result = astar_route(
-                    road_graph,
-                    start_node,
-                    goal_node,
-                    departure,
-                    alpha=request.weights.alpha,
-                    beta=request.weights.beta,
-                    gamma=request.weights.gamma,
+    # ── Step 2: A* for traffic-aware eco alternative ─────────
+    try:
+        if isinstance(astar_outcome, BaseException):
+            raise astar_outcome
+        astar_result, astar_overlay = astar_outcome
+
+        if astar_result:
+            # If we already have an OSRM primary, use A* data to
+            # enhance it with traffic-aware CO2 and duration estimates
+            if primary is not None:
+                # Overlay A* eco metrics onto the OSRM geometry
+                primary.co2Grams = round(astar_result["co2Grams"], 1)
+                primary.cost = round(astar_result["cost"], 4)
+                # Blend the duration (trust OSRM distance, A* traffic)
+                astar_dur = astar_result["durationMin"]
+                osrm_dur = primary.durationMin
+                primary.durationMin = round(
+                    osrm_dur * 0.6 + astar_dur * 0.4, 1
                 )
-
-                if astar_result:
-                    # If we already have an OSRM primary, use A* data to
-                    # enhance it with traffic-aware CO2 and duration estimates
-                    if primary is not None:
-                        # Overlay A* eco metrics onto the OSRM geometry
-                        primary.co2Grams = round(astar_result["co2Grams"], 1)
-                        primary.cost = round(astar_result["cost"], 4)
-                        # Blend the duration (trust OSRM distance, A* traffic)
-                        astar_dur = astar_result["durationMin"]
-                        osrm_dur = primary.durationMin
-                        primary.durationMin = round(
-                            osrm_dur * 0.6 + astar_dur * 0.4, 1
-                        )
-                    else:
-                        # No OSRM — use A* polyline as fallback
-                        primary = RouteResult(
-                            polyline=astar_result["polyline"],
-                            distanceKm=round(astar_result["distanceKm"], 2),
-                            durationMin=round(astar_result["durationMin"], 1),
-                            co2Grams=round(astar_result["co2Grams"], 1),
-                            cost=round(astar_result["cost"], 4),
-                        )
-
-                    # Build traffic overlay for the map
-                    traffic_overlay = get_traffic_overlay(
-                        road_graph, astar_result["path_nodes"], None, departure
-                    )
-        except Exception as e:
-            print(f"[Route] A* routing error: {e}")
+            else:
+                # No OSRM — use A* polyline as fallback
+                primary = RouteResult(
+                    polyline=astar_result["polyline"],
+                    distanceKm=round(astar_result["distanceKm"], 2),
+                    durationMin=round(astar_result["durationMin"], 1),
+                    co2Grams=round(astar_result["co2Grams"], 1),
+                    cost=round(astar_result["cost"], 4),
+                )
+            traffic_overlay = astar_overlay
+    except Exception as e:
+        print(f"[Route] A* routing error: {e}")
 
     # ── Step 3: Final check — never return an empty response ─
     if primary is None:
@@ -567,15 +635,18 @@ async def calculate_emissions(request: EmissionRequest):
 @app.post("/api/train")
 async def retrain_model(x_api_key: str = Header(None)):
     """Trigger model retraining (admin only, secured with API key)."""
-    if x_api_key != API_KEY:
+    if not check_api_key(x_api_key):
         raise HTTPException(status_code=401, detail="Invalid API key")
 
-    global model, scaler, model_metrics
+    global model, scaler, scaler_arrays, model_metrics
 
     try:
-        model, metrics = train_model()
+        m, metrics = train_model()
+        model = _serving_model(m)
         scaler = metrics["scaler"]
+        scaler_arrays = _scaler_arrays(scaler)
         model_metrics = metrics
+        _prediction_cache.clear()
         return {"status": "success", "metrics": {k: v for k, v in metrics.items() if k != "scaler"}}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Training failed: {str(e)}")
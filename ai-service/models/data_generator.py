@@ -45,12 +45,14 @@ def generate_base_traffic(hour: float, is_weekend: bool) -> Tuple[float, float]:
 
     # Base flow pattern (vehicles/5min): sinusoidal with peaks
     base_flow = 30.0
+    # Peak windows have integer bounds, so the hour's mask entry decides
+    hour_idx = int(hour) % 24
     # Morning peak
-    if cfg.peak_morning[0] <= hour < cfg.peak_morning[1]:
+    if cfg.peak_morning_mask[hour_idx]:
         peak_factor = 1.0 - abs(hour - 8.0) / 1.0
         base_flow += 50.0 * max(0, peak_factor)
     # Evening peak
-    elif cfg.peak_evening[0] <= hour < cfg.peak_evening[1]:
+    elif cfg.peak_evening_mask[hour_idx]:
         peak_factor = 1.0 - abs(hour - 18.0) / 1.0
         base_flow += 60.0 * max(0, peak_factor)
     # Midday moderate
@@ -125,6 +127,16 @@ def generate_synthetic_data() -> Tuple[np.ndarray, np.ndarray]:
     # Holidays (random 10 days)
     holidays = set(np.random.choice(cfg.num_days, size=10, replace=False))
 
+    # Base traffic depends only on the time of day and the weekend/holiday
+    # flag, so it is computed once per interval of the day for each case
+    base_traffic = {
+        off_day: [
+            generate_base_traffic(t * cfg.interval_minutes / 60.0, off_day)
+            for t in range(num_intervals_per_day)
+        ]
+        for off_day in (False, True)
+    }
+
     all_data = {}
 
     for seg_id in range(cfg.num_segments):
@@ -150,7 +162,7 @@ def generate_synthetic_data() -> Tuple[np.ndarray, np.ndarray]:
             is_holiday = day in holidays
 
             # Base traffic
-            base_flow, base_speed = generate_base_traffic(hour, is_weekend or is_holiday)
+            base_flow, base_speed = base_traffic[is_weekend or is_holiday][time_in_day]
 
             # Scale to segment characteristics
             base_speed = base_speed * (seg_free_flow / 60.0)
@@ -195,33 +207,36 @@ def generate_synthetic_data() -> Tuple[np.ndarray, np.ndarray]:
 
         all_data[seg_id] = np.array(segment_data)
 
-    # Create sliding window sequences
+    # Create sliding window sequences: each window of lookback + forecast
+    # timesteps is one sample (windows start at 0 .. total_len - window - 1)
     lookback = mcfg.lookback  # 12
-    forecast = mcfg.forecast  # 6
 
     X_list = []
     y_list = []
 
     for seg_id in range(cfg.num_segments):
         data = all_data[seg_id]
-        total_len = len(data)
-
-        for i in range(lookback, total_len - forecast):
-            # Input: lookback timesteps of all 10 features
-            X_list.append(data[i - lookback: i])
-
-            # Target: next forecast timesteps of [speed, flow, congestion]
-            target_data = data[i: i + forecast]
-            # Extract speed (idx=1), flow (idx=0), congestion (derived from density idx=2)
-            targets = np.column_stack([
-                target_data[:, 1],  # speed
-                target_data[:, 0],  # flow
-                np.clip(target_data[:, 2] / 1.5, 0, 1),  # congestion level
-            ])
-            y_list.append(targets)
-
-    X = np.array(X_list, dtype=np.float32)
-    y = np.array(y_list, dtype=np.float32)
+        n_windows = len(data) - mcfg.window
+        if n_windows <= 0:
+            continue
+        # (n_windows, window, features) view, no copy
+        windows = np.lib.stride_tricks.sliding_window_view(data, mcfg.window, axis=0)
+        windows = windows[:n_windows].transpose(0, 2, 1)
+
+        # Input: lookback timesteps of all 10 features
+        X_list.append(windows[:, :lookback])
+
+        # Target: next forecast timesteps of [speed, flow, congestion]
+        target_data = windows[:, lookback:]
+        # Extract speed (idx=1), flow (idx=0), congestion (derived from density idx=2)
+        y_list.append(np.stack([
+            target_data[:, :, 1],  # speed
+            target_data[:, :, 0],  # flow
+            np.clip(target_data[:, :, 2] / 1.5, 0, 1),  # congestion level
+        ], axis=-1))
+
+    X = np.concatenate(X_list).astype(np.float32)
+    y = np.concatenate(y_list).astype(np.float32)
 
     print(f"[DataGenerator] Generated {X.shape[0]} samples")
     print(f"[DataGenerator] X shape: {X.shape}, y shape: {y.shape}")
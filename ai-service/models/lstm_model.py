@@ -175,10 +175,9 @@ class TrafficLoss(nn.Module):
         # MSE loss: (1/N) Σ(yₜ - ŷₜ)²
         mse_loss = self.mse(predictions, targets)
 
-        # L2 regularization: λ₁‖W‖²
-        l2_reg = torch.tensor(0.0, device=predictions.device)
-        for param in model.parameters():
-            l2_reg = l2_reg + torch.sum(param ** 2)
+        # L2 regularization: λ₁‖W‖² (summed from Python 0, so no per-batch
+        # zero tensor is allocated and copied to the device)
+        l2_reg = sum(torch.sum(param ** 2) for param in model.parameters())
         l2_loss = self.l2_lambda * l2_reg
 
         # Temporal smoothness: λ₂ Σ|∂ŷ/∂t - ∂y/∂t|²
@@ -187,7 +186,7 @@ class TrafficLoss(nn.Module):
             target_diff = targets[:, 1:, :] - targets[:, :-1, :]        # ∂y/∂t
             temporal_loss = self.temporal_lambda * torch.mean((pred_diff - target_diff) ** 2)
         else:
-            temporal_loss = torch.tensor(0.0, device=predictions.device)
+            temporal_loss = predictions.new_zeros(())
 
         total_loss = mse_loss + l2_loss + temporal_loss
         return total_loss
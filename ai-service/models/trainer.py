@@ -21,6 +21,11 @@ from models.data_generator import generate_synthetic_data, normalize_data
 from config import model_config, MODEL_PATH
 
 
+def _as_tensor(a: np.ndarray) -> torch.Tensor:
+    """float32 tensor sharing memory with a (copies only if a is not contiguous float32)."""
+    return torch.from_numpy(np.ascontiguousarray(a, dtype=np.float32))
+
+
 def create_dataloaders(
     X: np.ndarray,
     y: np.ndarray,
@@ -37,9 +42,10 @@ def create_dataloaders(
     X_val, y_val = X[train_end:val_end], y[train_end:val_end]
     X_test, y_test = X[val_end:], y[val_end:]
 
-    train_dataset = TensorDataset(torch.FloatTensor(X_train), torch.FloatTensor(y_train))
-    val_dataset = TensorDataset(torch.FloatTensor(X_val), torch.FloatTensor(y_val))
-    test_dataset = TensorDataset(torch.FloatTensor(X_test), torch.FloatTensor(y_test))
+    # Views of the normalized arrays, not copies (the full X is ~600 MB)
+    train_dataset = TensorDataset(_as_tensor(X_train), _as_tensor(y_train))
+    val_dataset = TensorDataset(_as_tensor(X_val), _as_tensor(y_val))
+    test_dataset = TensorDataset(_as_tensor(X_test), _as_tensor(y_test))
 
     train_loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=True, drop_last=True)
     val_loader = DataLoader(val_dataset, batch_size=batch_size, shuffle=False)
@@ -9,6 +9,7 @@ import math
 from typing import Tuple
 
 EARTH_RADIUS_M = 6_371_000.0
+_DEG2RAD = math.pi / 180.0
 
 
 def haversine(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
@@ -17,10 +18,10 @@ def haversine(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
     a = sin²(Δφ/2) + cos(φ₁)·cos(φ₂)·sin²(Δλ/2)
     d = 2R · arctan2(√a, √(1−a))
     """
-    phi1 = math.radians(lat1)
-    phi2 = math.radians(lat2)
-    delta_phi = math.radians(lat2 - lat1)
-    delta_lambda = math.radians(lng2 - lng1)
+    phi1 = lat1 * _DEG2RAD
+    phi2 = lat2 * _DEG2RAD
+    delta_phi = (lat2 - lat1) * _DEG2RAD
+    delta_lambda = (lng2 - lng1) * _DEG2RAD
 
     a = (
         math.sin(delta_phi / 2) ** 2
@@ -30,6 +31,19 @@ def haversine(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
     return d
 
 
+def haversine_rad(phi1: float, lam1: float, phi2: float, lam2: float) -> float:
+    """haversine() for coordinates already in radians. Returns meters.
+
+    For points converted once up front (e.g. cached ride polylines), so each
+    call skips the four degree→radian conversions.
+    """
+    a = (
+        math.sin((phi2 - phi1) / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin((lam2 - lam1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_M * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
 def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
     """Haversine distance in kilometers."""
     return haversine(lat1, lng1, lat2, lng2) / 1000.0
@@ -0,0 +1,102 @@
+"""Numba-compiled haversine kernels.
+
+Same formula as utils.haversine:
+    a = sin²(Δφ/2) + cos(φ₁)·cos(φ₂)·sin²(Δλ/2)
+    d = 2R · arctan2(√a, √(1−a))
+
+haversine_nb is the scalar version callable from other @njit code (the A*
+kernels). haversine_a_vec evaluates only the term a from one point to
+arrays of points, for nearest-point searches. haversine_pairwise
+builds a full symmetric distance matrix.
+
+equirect_nb is the short-range equirectangular approximation
+    x = Δλ·cos(φ_ref),  y = Δφ,  d = R·√(x² + y²)
+which needs no trig per call once cos(φ_ref) is known; within a city
+(< ~50 km) it stays within 0.1% of haversine.
+"""
+
+import math
+
+import numpy as np
+from numba import njit
+
+from utils.haversine import EARTH_RADIUS_M
+
+
+@njit(cache=True)
+def haversine_nb(lat1, lng1, lat2, lng2):
+    """Haversine distance between two points in meters."""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    delta_phi = math.radians(lat2 - lat1)
+    delta_lambda = math.radians(lng2 - lng1)
+    a = (
+        math.sin(delta_phi / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_M * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+@njit(cache=True)
+def haversine_a_vec(lat1, lng1, lats, lngs, out):
+    """Haversine term a from (lat1, lng1) to each (lats[i], lngs[i]).
+
+    The distance 2R·arctan2(√a, √(1−a)) is monotonic in a, so ranking points
+    by a ranks them by distance without the arctan2/sqrt per point.
+    Writes into and returns out (same length as lats).
+    """
+    phi1 = math.radians(lat1)
+    cos_phi1 = math.cos(phi1)
+    for i in range(len(lats)):
+        phi2 = math.radians(lats[i])
+        s_phi = math.sin((phi2 - phi1) / 2)
+        s_lam = math.sin(math.radians(lngs[i] - lng1) / 2)
+        out[i] = s_phi * s_phi + cos_phi1 * math.cos(phi2) * s_lam * s_lam
+    return out
+
+
+@njit(cache=True)
+def haversine_to_ref(lat, lng, ref_lat, ref_lng, cos_ref):
+    """haversine_nb(lat, lng, ref_lat, ref_lng) with cos(φ_ref) supplied by the caller.
+
+    For repeated distances to one fixed point (e.g. the A* goal), so its
+    trig is evaluated once per search rather than once per call.
+    """
+    delta_phi = math.radians(ref_lat - lat)
+    delta_lambda = math.radians(ref_lng - lng)
+    a = (
+        math.sin(delta_phi / 2) ** 2
+        + math.cos(math.radians(lat)) * cos_ref * math.sin(delta_lambda / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_M * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+@njit(cache=True)
+def equirect_nb(lat1, lng1, lat2, lng2, cos_ref):
+    """Equirectangular distance in meters, with cos(φ_ref) supplied by the caller."""
+    x = math.radians(lng2 - lng1) * cos_ref
+    y = math.radians(lat2 - lat1)
+    return EARTH_RADIUS_M * math.sqrt(x * x + y * y)
+
+
+@njit(cache=True)
+def haversine_pairwise(lats, lngs):
+    """Symmetric matrix of haversine distances in meters between all points.
+
+    cos(φ) is evaluated once per point and each pair once (upper triangle,
+    mirrored).
+    """
+    n = len(lats)
+    phi = np.radians(lats)
+    lam = np.radians(lngs)
+    cos_phi = np.cos(phi)
+    out = np.zeros((n, n))
+    for i in range(n):
+        for j in range(i + 1, n):
+            s_phi = math.sin((phi[j] - phi[i]) / 2)
+            s_lam = math.sin((lam[j] - lam[i]) / 2)
+            a = s_phi * s_phi + cos_phi[i] * cos_phi[j] * s_lam * s_lam
+            d = 2 * EARTH_RADIUS_M * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+            out[i, j] = d
+            out[j, i] = d
+    return out